@@ -1,88 +1,138 @@
+import os
+import sys
 import streamlit as st
-import plotly.graph_objects as go
 from datetime import datetime, timedelta
-import sqlite3
 import pandas as pd
 import warnings
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.batch import delete_items, mark_done, reschedule_items, undo_done
+from core.charts import AGGREGATE_THRESHOLD, calendar_heatmap, forecast_chart, revision_chart
+from core.forecast import summarize
+from core.instrument import phase, profiled_run, timed
+from core.pagination import paginated_table
+from core.revision_schema import SYNC_TABLES, migrate
+from core.revisions import (OVERDUE_LIMIT, PICKER_LIMIT, TOPIC_ORDER, count_overdue, count_topics, db_path,
+                            find_topic_names, forecast_workload, insert_topic, remove_entry_by_topic, retrieve_daily_load,
+                            retrieve_overdue, retrieve_revisions_due_on, retrieve_topic, retrieve_topics_due_on,
+                            retrieve_topics_page, revision_schedule_chart, update_revision_completion)
+from core.scheduler import DEFAULT_PATTERN, STRATEGIES, initial_schedule, parse_pattern, reschedule
+from core.sync import sync_sidebar
+from core.tenants import session_tenant
+
 warnings.filterwarnings("ignore")
 
-# Function to create SQLite database table if not exists
-def create_table():
-    conn = sqlite3.connect("revision_schedule.db")
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS topics
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT, 
-                 topic_name TEXT UNIQUE NOT NULL,
-                 entry_date DATE NOT NULL,
-                 revision_1 DATE NOT NULL,
-                 done_1 INTEGER NOT NULL,
-                 revision_2 DATE NOT NULL,
-                 done_2 INTEGER NOT NULL, 
-                 revision_3 DATE NOT NULL,
-                 done_3 INTEGER NOT NULL,
-                 revision_4 DATE NOT NULL,
-                 done_4 INTEGER NOT NULL,
-                 revision_5 DATE NOT NULL,
-                 done_5 INTEGER NOT NULL)''')
-    conn.commit()
-    conn.close()
-
-# Function to insert a new topic into the database
-def insert_topic(topic_name, entry_date, revision_dates):
-    conn = sqlite3.connect("revision_schedule.db")
-    c = conn.cursor()
-    c.execute('''INSERT OR REPLACE INTO topics (topic_name, entry_date, revision_1,  done_1,revision_2,done_2, revision_3,done_3, revision_4,done_4, revision_5,done_5) 
-                    VALUES (?, ?, ?, ?, ?, ?, ?,?, ?, ?, ?, ?)''', 
-                (topic_name, entry_date, revision_dates[0],0,revision_dates[1],0, revision_dates[2],0, revision_dates[3],0, revision_dates[4],0))
-    conn.commit()
-    conn.close()
-
-# Function to remove entry from the database by topic name
-def remove_entry_by_topic(topic_name):
-    conn = sqlite3.connect("revision_schedule.db")
-    c = conn.cursor()
-    c.execute("DELETE FROM topics WHERE topic_name=?", (topic_name,))
-    conn.commit()
-    conn.close()
-
-# Function to retrieve all topics from the database
-def retrieve_topics():
-    conn = sqlite3.connect("revision_schedule.db")
-    c = conn.cursor()
-    c.execute("SELECT topic_name, revision_1,done_1, revision_2,done_2, revision_3,done_3, revision_4,done_4, revision_5,done_4 FROM topics")
-    topics = c.fetchall()
-    conn.close()
-    return topics
-
-# Function to update revision done 
-def update_revision_completion(topic_done,col_to_update):
-    conn = sqlite3.connect("revision_schedule.db")
-    c = conn.cursor()
-    sql = f"UPDATE topics SET {col_to_update}=1 WHERE topic_name=?"
-    c.execute(sql, (topic_done,))
-    conn.commit()
-    conn.close()
+HEATMAP_WEEKS = 12
+# Scenarios drawn in the forecast chart, lowest peak first; the table lists all of them
+FORECAST_LINES = 10
+
+TOPIC_COLUMNS = ["Topic Name", "Revision 1", "Done 1 ","Revision 2", "Done 2", "Revision 3",  "Done 3", "Revision 4",  "Done 4", 
+               "Revision 5", "Done 5"]
 
 # Function to generate revision chart for all topics
-def generate_revision_chart(topics):
-    fig = go.Figure()
-    for topic in topics:
-        topic_name, revision_dates = topic[0], topic[1::2]
-        revision_numbers = list(range(1, 6))
-        fig.add_trace(go.Scatter(x=revision_dates, y=revision_numbers, mode='lines+markers', name=topic_name))
-    fig.update_layout(
-        title="Revision Schedule",
-        xaxis_title="Revision Date",
-        yaxis_title="Revision Number",
-        xaxis=dict(tickformat="%Y-%m-%d"),
-        yaxis=dict(tickvals=revision_numbers, ticktext=["Revision " + str(i) for i in revision_numbers]),
-        showlegend=True
-    )
-    return fig
-
-# Create database table if not exists
-create_table()
+@timed("generate_revision_chart")
+def generate_revision_chart(topics, aggregate_threshold=AGGREGATE_THRESHOLD, date_window=None):
+    topic_names = [topic[0] for topic in topics]
+    revision_dates = [topic[1::2] for topic in topics]
+    return revision_chart(topic_names, revision_dates, aggregate_threshold, date_window)
+
+# One page of topics as a DataFrame, for the paginated table
+@timed("topics_page_dataframe")
+def topics_page_dataframe(limit, offset, sort):
+    return pd.DataFrame(retrieve_topics_page(limit, offset, sort), columns=TOPIC_COLUMNS)
+
+# Function to apply one action to many revisions due on a date with a single write and a single rerun
+def show_batch_actions(filter_date, strategy):
+    revisions = retrieve_revisions_due_on(filter_date)
+    if not revisions:
+        return
+    labels = {(topic_name, revision_no): f"{topic_name} - Revision {revision_no}{' (done)' if done else ''}"
+              for topic_name, revision_no, done in revisions}
+    pending = [(topic_name, revision_no) for topic_name, revision_no, done in revisions if not done]
+
+    st.title(f'Review revisions due {filter_date}')
+    with st.form("batch_actions"):
+        select_all = st.checkbox("Select all")
+        items = st.multiselect("Revisions", list(labels), format_func=labels.get)
+        action = st.radio("Action", ["Mark done", "Undo", "Reschedule", "Delete"], horizontal=True)
+        new_date = st.date_input("New due date (for Reschedule)")
+        apply = st.form_submit_button("Apply")
+
+    if apply:
+        items = list(labels) if select_all else items
+        if not items:
+            st.warning("No revisions selected.")
+            return
+        if action == "Mark done":
+            # Done revisions keep their completion date
+            mark_done(db_path(), [item for item in items if item in pending], strategy)
+        elif action == "Undo":
+            undo_done(db_path(), items, strategy)
+        elif action == "Reschedule":
+            reschedule_items(db_path(), items, new_date)
+        else:
+            delete_items(db_path(), items)
+        st.rerun()
+
+# Function to show today's, upcoming and overdue work from the daily_load totals
+def show_workload():
+    today = datetime.today().date()
+    st.title("Workload")
+    days_ahead = st.slider("Due in the next N days", min_value=1, max_value=90, value=7)
+    upcoming = retrieve_daily_load(str(today), str(today + timedelta(days=days_ahead - 1)))
+    pending_today = sum(total - done for due_date, total, done in upcoming if due_date == today)
+    pending_ahead = sum(total - done for due_date, total, done in upcoming)
+    overdue = count_overdue(str(today))
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Due today", pending_today)
+    col2.metric(f"Due in the next {days_ahead} days", pending_ahead)
+    col3.metric("Overdue", overdue)
+
+    start = today - timedelta(days=today.weekday() + 7 * (HEATMAP_WEEKS // 4))
+    end = start + timedelta(weeks=HEATMAP_WEEKS, days=-1)
+    load = {str(due_date): total - done for due_date, total, done in retrieve_daily_load(str(start), str(end))}
+    st.plotly_chart(calendar_heatmap(load, start, HEATMAP_WEEKS), use_container_width=True)
+
+    if overdue:
+        st.subheader(f"Overdue (oldest {min(overdue, OVERDUE_LIMIT)} of {overdue})")
+        st.dataframe(pd.DataFrame(retrieve_overdue(str(today)), columns=["Topic Name", "Revision", "Due Date"]),
+                     hide_index=True, use_container_width=True)
+
+# Function to compare candidate revision patterns by the daily load they would lead to
+def show_forecast(scheduler, revision_pattern):
+    st.title("Workload Forecast")
+    with st.form("forecast"):
+        patterns_text = st.text_area("Candidate patterns (days, one pattern per line)",
+                                     "\n".join([", ".join(map(str, revision_pattern)), "3, 7, 14, 30, 60", "7, 21, 45, 90, 180"]))
+        rates_text = st.text_input("New topics per day", "0, 1, 3")
+        horizon = st.slider("Forecast horizon (days)", min_value=30, max_value=1095, value=365, step=15)
+        run = st.form_submit_button("Run forecast")
+
+    if run:
+        try:
+            patterns = tuple(parse_pattern(line) for line in patterns_text.splitlines() if line.strip())
+        except ValueError as e:
+            st.error(str(e))
+            return
+        try:
+            rates = tuple(float(rate) for rate in rates_text.split(",") if rate.strip())
+        except ValueError:
+            st.error("New topics per day must be a comma-separated list of numbers.")
+            return
+        if not patterns or not rates:
+            st.warning("Enter at least one pattern and one rate.")
+            return
+        st.session_state["forecast_inputs"] = (scheduler, patterns, rates, horizon)
+
+    if "forecast_inputs" not in st.session_state:
+        return
+    scenarios, loads = forecast_workload(*st.session_state["forecast_inputs"])
+    summary = summarize(scenarios, loads)
+    shown = summary.index[:FORECAST_LINES]
+    labels = [f"{summary.at[i, 'Pattern']} at {summary.at[i, 'New topics per day']:g}/day" for i in shown]
+    st.plotly_chart(forecast_chart(labels, loads[shown], datetime.today().date()), use_container_width=True)
+    st.dataframe(summary, hide_index=True, use_container_width=True)
 
 def main():
     st.sidebar.title("Input Topic Data")
@@ -90,15 +140,27 @@ def main():
     entry_date = st.sidebar.date_input("Enter the date")
     add_topic = st.sidebar.button("Add Topic")
 
-    revision_pattern = [7,14,30,60,90]
+    st.sidebar.markdown("***")
+    st.sidebar.title("Schedule")
+    scheduler = st.sidebar.selectbox("Scheduler", list(STRATEGIES))
+    pattern_text = st.sidebar.text_input("Revision pattern (days)", ", ".join(map(str, DEFAULT_PATTERN)))
+    try:
+        revision_pattern = parse_pattern(pattern_text)
+    except ValueError as e:
+        st.sidebar.error(str(e))
+        revision_pattern = DEFAULT_PATTERN
+    strategy = STRATEGIES[scheduler](revision_pattern)
+
+    if st.sidebar.button("Reschedule pending revisions"):
+        moved = reschedule(db_path(), strategy)
+        st.sidebar.success(f"{moved} revisions rescheduled!")
+    if st.sidebar.button("Catch up overdue revisions"):
+        moved = reschedule(db_path(), strategy, catch_up=True)
+        st.sidebar.success(f"{moved} revisions rescheduled!")
 
     if add_topic:
         # Calculate revision dates based on the pattern
-        revision_dates = []
-        current_revision_date = entry_date
-        for after_days in revision_pattern:
-            current_revision_date = current_revision_date + timedelta(days=after_days)
-            revision_dates.append(current_revision_date)
+        revision_dates = initial_schedule(strategy, [entry_date])[0]
 
         insert_topic(topic_name.strip(), entry_date, revision_dates)
         st.sidebar.success("Topic added successfully!")
@@ -107,6 +169,16 @@ def main():
     st.sidebar.title("Filter by Date")
     filter_date = str(st.sidebar.date_input("Select Date"))
 
+    st.sidebar.markdown("***")
+    st.sidebar.title("Chart Options")
+    aggregate_threshold = st.sidebar.number_input("Show daily totals above this many topics", min_value=0,
+                                                  value=AGGREGATE_THRESHOLD, step=100)
+    date_window = None
+    if st.sidebar.checkbox("Limit chart to a date window"):
+        window = st.sidebar.date_input("Chart window", value=(datetime.today(), datetime.today() + timedelta(days=30)))
+        if len(window) == 2:
+            date_window = tuple(window)
+
     st.sidebar.markdown("***")
     remove_topic_name = st.sidebar.text_input("Topic to Remove")
     remove_topic = st.sidebar.button("Remove Topic")
@@ -115,53 +187,57 @@ def main():
         remove_entry_by_topic(remove_topic_name.strip())
         st.sidebar.success("Topic removed successfully!")
 
+    sync_sidebar(db_path(), SYNC_TABLES, setup=migrate)
+
     # Display revision chart for all topics
-    topics = retrieve_topics()
-    
-    if topics:
+    if count_topics():
         
-        fig = generate_revision_chart(topics)
+        fig = revision_schedule_chart(aggregate_threshold, date_window)
         st.title("Revision Schedule")
-        st.plotly_chart(fig, use_container_width=True)
+        with phase("render revision chart"):
+            st.plotly_chart(fig, use_container_width=True)
+
+        with phase("workload panel"):
+            show_workload()
+
+        with phase("forecast"):
+            show_forecast(scheduler, revision_pattern)
         
-        # Filter topics based on selected date
-        df = pd.DataFrame(topics, columns=["Topic Name", "Revision 1", "Done 1 ","Revision 2", "Done 2", "Revision 3",  "Done 3", "Revision 4",  "Done 4", 
-                                           "Revision 5", "Done 5"])
         st.title('Topic Data')
-        st.write(df)
+        with phase("topic table"):
+            paginated_table("topics", count_topics(), topics_page_dataframe, list(TOPIC_ORDER))
 
-        # Add revision done
+        # Add revision done; only the topics matching the search are offered, never the whole library
         st.sidebar.markdown("***")
-        topic_done = st.sidebar.selectbox('Select topic name:', df['Topic Name'].tolist())
-        if topic_done:
-            temp_df = df[df['Topic Name']==topic_done]
-            done_date = st.sidebar.selectbox('Select completion date: ', temp_df[["Revision 1","Revision 2", "Revision 3", "Revision 4","Revision 5"]].iloc[0])            
-            mark_done = st.sidebar.button("Mark done")
-
-            if mark_done:
-                rev_no = temp_df.columns[temp_df.eq(done_date).any()].to_list()
-                col_to_update = f'done_{rev_no[0].split(" ")[1]}'
-                update_revision_completion(topic_done,col_to_update)
-                st.experimental_rerun()
-
-        # Initialize lists to store matched topic names and column names
-        matched_topic_names = []
-        matched_column_names = []
-
-        # Iterate over each row and column
-        for index, row in df.iterrows():
-            topic_name = row["Topic Name"]
-            for col_name, col_value in row.iteritems():
-                if col_name != "Topic Name":
-                    if col_value == filter_date:
-                        matched_topic_names.append(topic_name)
-                        matched_column_names.append(col_name)
+        find_text = st.sidebar.text_input("Find topic (name starts with)")
+        topic_done = st.sidebar.selectbox(f'Select topic name (first {PICKER_LIMIT} matches):',
+                                          find_topic_names(find_text.strip()))
+        topic = retrieve_topic(topic_done) if topic_done else None
+        if topic:
+            revision_dates, done_flags = topic[1::2], topic[2::2]
+            # Only revisions not done yet are offered
+            pending_revisions = [n for n in range(1, len(revision_dates) + 1) if not done_flags[n - 1]]
+            if pending_revisions:
+                rev_no = st.sidebar.selectbox('Select completion date: ', pending_revisions,
+                                              format_func=lambda n: str(revision_dates[n - 1]))
+                mark_done = st.sidebar.button("Mark done")
+
+                if mark_done:
+                    update_revision_completion(topic_done,rev_no,strategy)
+                    st.rerun()
+            else:
+                st.sidebar.caption("Every revision of this topic is done.")
+
+        # Look up the revisions due on the selected date
+        matched_topics = retrieve_topics_due_on(filter_date)
         
-        if len(matched_topic_names)!=0:
+        if len(matched_topics)!=0:
             # Create DataFrame from matched topic names and column names
-            matched_df = pd.DataFrame({"Topic Name": matched_topic_names, "Matched Column Name": matched_column_names})
+            matched_df = pd.DataFrame(matched_topics, columns=["Topic Name", "Matched Column Name"])
             st.title(f'Filtered topics for {filter_date}')
             st.write(matched_df)
+            with phase("batch actions"):
+                show_batch_actions(filter_date, strategy)
         else:
             st.title(f'Filtered topics for {filter_date}')
             st.write("No topics to revise on the selected date.")
@@ -170,4 +246,5 @@ def main():
         st.write("No topics found in the database.")
 
 if __name__ == "__main__":
-    main()
+    with profiled_run("Revision Schedule App"), session_tenant():
+        main()
@@ -1,146 +1,66 @@
+import io
+import os
+import sqlite3
+import sys
 import streamlit as st
 from datetime import datetime, timedelta
-import sqlite3
 import pandas as pd
 import warnings
-import plotly.express as px
 
-warnings.filterwarnings("ignore")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.cache import get_version
+from core.csv_import import file_hash, import_topics_csv
+from core.export import EXPORT_FORMATS
+from core.instrument import phase, profiled_run, timed
+from core.pagination import paginated_table
+from core.sync import sync_sidebar
+from core.tenants import session_tenant
+from core.topics import (SYNC_TABLES, TOPIC_COLUMNS, TOPIC_ORDER, category_chart, count_topics, create_schema,
+                         db_path, export_topics, get_max_position, insert_topic, remove_entry_by_topic, reorder_topic,
+                         retrieve_topics_page, search_topics)
 
-# Function to create SQLite database table if not exists
-def create_table():
-    conn = sqlite3.connect("topic.db")
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS topics
-              (position INTEGER, 
-              topic_name TEXT UNIQUE NOT NULL,
-              category TEXT NOT NULL, 
-              resource TEXT NOT NULL)''')
-    conn.commit()
-    conn.close()
-
-def get_max_position(category):
-    # Connect to the SQLite database
-    conn = sqlite3.connect('topic.db')
-    cursor = conn.cursor()
-
-    # Execute the SQL query to get the maximum position value for the specified category
-    cursor.execute("SELECT Count(*) FROM topics WHERE Category = ?", (category,))
-    max_position = cursor.fetchone()[0]
-
-    # Close the database connection
-    conn.close()
-
-    return max_position
-
-# Function to insert a new topic into the database
-def insert_topic(max_pos,topic_name,category,resource):
-    conn = sqlite3.connect("topic.db")
-    c = conn.cursor()
-    try :
-        c.execute('''INSERT INTO topics (position,topic_name, category,resource) 
-                        VALUES (? , ?, ?, ?)''', 
-                    (max_pos,topic_name,category,resource))
-    except:
-        pass    
-    conn.commit()
-    conn.close()
-
-# Function to remove entry from the database by topic name
-def remove_entry_by_topic(topic_name):
-    conn = sqlite3.connect("topic.db")
-    c = conn.cursor()
-
-    # Extract the category of the topic at the specified position
-    c.execute("SELECT position,category FROM topics WHERE topic_name = ?", (topic_name,))
-    result = c.fetchone()
-    
-    c.execute("DELETE FROM topics WHERE topic_name=?", (topic_name,))
-    c.execute("UPDATE topics SET position = position - 1 WHERE position > ? AND category = ?", 
-              (result[0],result[1]))
-
-    # Commit the changes to the database
-    conn.commit()
-    conn.close()
-
-# Function to retrieve all topics from the database
-def retrieve_topics():
-    conn = sqlite3.connect("topic.db")
-    c = conn.cursor()
-    c.execute("SELECT position,topic_name, category ,resource FROM topics")
-    topics = c.fetchall()
-    conn.close()
-    return topics
-
-def reorder_topic(topic_name, new_pos):
-    # Connect to the SQLite database
-    conn = sqlite3.connect('topic.db')
-    cursor = conn.cursor()
-
-    # Retrieve the current position of the topic to be reordered
-    cursor.execute("SELECT position FROM topics WHERE topic_Name = ?", (topic_name,))
-    current_position = cursor.fetchone()[0]
-
-    # If the new index is greater than the current position,
-    # shift topics between the current position and the new index down by 1
-    if new_pos > current_position:
-        cursor.execute("UPDATE topics SET position = position - 1 WHERE position > ? AND position <= ?", (current_position, new_pos))
-
-    # If the new index is less than the current position,
-    # shift topics between the new index and the current position up by 1
-    elif new_pos < current_position:
-        cursor.execute("UPDATE topics SET position = position + 1 WHERE position >= ? AND position < ?", (new_pos, current_position))
-
-    # Update the position of the topic to be reordered to the new index
-    cursor.execute("UPDATE topics SET position = ? WHERE Topic_Name = ?", (new_pos, topic_name))
-
-    conn.commit()
-    conn.close()
-
-# Function to insert rows into the database
-def insert_rows(rows):
-    # Connect to the SQLite database
-    conn = sqlite3.connect('topic.db')
-    c = conn.cursor()
-
-    for row in rows:
-        try :
-            c.execute('''INSERT INTO topics (position,topic_name, category,resource) 
-                        VALUES (? , ?, ?, ?)''', (row))
-        except:
-            pass  
-
-    conn.commit()
-    conn.close()
-
-def delete_rows():
-    conn = sqlite3.connect('topic.db')
-    c = conn.cursor()
-
-    c.execute("DELETE FROM topics")
-
-    conn.commit()
-    conn.close()
+warnings.filterwarnings("ignore")
 
 # Function to display the upload button and process the uploaded file
 def upload_and_process():
     uploaded_file = st.sidebar.file_uploader("Upload Data", type=['csv'])
     if uploaded_file is not None:
-        # Read the CSV file
-        df = pd.read_csv(uploaded_file)
-        rows = [tuple(row) for row in df.values]
-
-        delete_rows()
-        insert_rows(rows)
-        st.sidebar.success("Data added successfully!")
-
-
-# Create database table if not exists
-create_table()
+        data = uploaded_file.getvalue()
+        digest = file_hash(data)
+
+        # Streamlit keeps the file attached across reruns, so only import a new upload once
+        if st.session_state.get("imported_file_hash") != digest:
+            try:
+                st.session_state["import_result"] = import_topics_csv(db_path(), io.BytesIO(data))
+            except Exception as e:
+                # Any failure is recorded against the file, so a bad upload is not retried on every rerun
+                st.session_state["import_result"] = None
+                st.session_state["import_error"] = str(e)
+            st.session_state["imported_file_hash"] = digest
+
+        result = st.session_state["import_result"]
+        if result is None:
+            st.sidebar.error(f"Could not import file: {st.session_state['import_error']}")
+            return
+
+        summary = f"{result.upserted} added or updated, {result.unchanged} unchanged, {result.deleted} removed."
+        if result.rejected:
+            st.sidebar.warning(f"Data imported with {len(result.rejected)} rows rejected: {summary} "
+                               "Topics named on rejected rows were left unchanged.")
+            st.sidebar.dataframe(pd.DataFrame(result.rejected, columns=["Line", "Reason"]), hide_index=True)
+        else:
+            st.sidebar.success(f"Data added successfully! {summary}")
+
+
+# One page of topics as a DataFrame, for the paginated tables
+@timed("topics_page_dataframe")
+def topics_page_dataframe(category, limit, offset, sort):
+    return pd.DataFrame(retrieve_topics_page(category, limit, offset, sort), columns=TOPIC_COLUMNS)
 
 def main():
 
-    upload_and_process()
+    with phase("csv upload"):
+        upload_and_process()
 
     st.sidebar.markdown("***")
     st.sidebar.title("Input Topic Data")
@@ -151,8 +71,13 @@ def main():
 
     if add_topic:
         max_pos = get_max_position(category)
-        insert_topic(max_pos,topic_name.strip(),category,resource)
-        st.sidebar.success("Topic added successfully!")
+        try:
+            insert_topic(max_pos,topic_name.strip(),category,resource)
+            st.sidebar.success("Topic added successfully!")
+        except sqlite3.IntegrityError:
+            st.sidebar.error(f"A topic named '{topic_name.strip()}' already exists.")
+        except sqlite3.OperationalError as e:
+            st.sidebar.error(f"Could not add the topic: {e}")
 
     st.sidebar.markdown("***")
     st.sidebar.title("Filter by Topic Category")
@@ -177,54 +102,51 @@ def main():
         remove_entry_by_topic(remove_topic_name.strip())
         st.sidebar.success("Topic removed successfully!")
 
-    # Display revision chart for all topics
-    topics = retrieve_topics()
+    sync_sidebar(db_path(), SYNC_TABLES, setup=create_schema)
 
-    if topics:
+    if count_topics():
         
         st.title('Topic Resource Assistant')
-        df = pd.DataFrame(topics, columns=["Position","Topic Name", "Category", "Resource"])
-        df.sort_values(by=['Category','Position'],inplace=True)
 
-         # Add a button to download the CSV file
-        csv = df.to_csv(index=False).encode('utf-8')
-
-        # Offer the CSV file for download
+        # Build the download only when asked for, and only offer it while the data is unchanged
         st.sidebar.markdown("***")
-        st.sidebar.download_button(
-            label="Download Data",
-            data=csv,
-            file_name='topic-resource.csv',
-            mime='text/csv'
-        )  
-
-        # Filter topics based on selected date
+        export_format = st.sidebar.selectbox("Download format", list(EXPORT_FORMATS))
+        if st.sidebar.button("Prepare download"):
+            st.session_state["export_ready"] = (export_format, get_version(db_path()))
+        if st.session_state.get("export_ready") == (export_format, get_version(db_path())):
+            with phase("export"):
+                data = export_topics(export_format)
+            st.sidebar.download_button(
+                label="Download Data",
+                data=data,
+                file_name=f'topic-resource.{EXPORT_FORMATS[export_format].extension}',
+                mime=EXPORT_FORMATS[export_format].mime
+            )
+
+        # Show the selected category one page at a time
         if filter_category is not None:
+            category = None if filter_category == 'All' else filter_category
+            total = count_topics(category)
 
-            if filter_category =='All':
-                df_filter1 = df.copy()
-            else:
-                df_filter1 = df[df['Category']==filter_category]
-            
-            if len(df_filter1)!=0:
-                # Create DataFrame from matched topic names and column names
-                st.markdown("***")
-                st.title(f'Topics : {filter_category}')
-                st.table(df_filter1)
+            st.markdown("***")
+            st.title(f'Topics : {filter_category}')
+            if total != 0:
+                with phase("category table"):
+                    paginated_table("category_topics", total,
+                                    lambda limit, offset, sort: topics_page_dataframe(category, limit, offset, sort),
+                                    list(TOPIC_ORDER))
             else:
-                st.markdown("***")
-                st.title(f'Topics : {filter_category}')
                 st.write("No topics added!")
         else :
             st.markdown("***")
             st.write("No topic category to filter.")
             
         if len(filter_topic)!=0:
-            df_filter2 = df[df['Topic Name'].str.contains(filter_topic.strip(), case=False)]
+            df_filter2 = pd.DataFrame(search_topics(filter_topic.strip()), columns=TOPIC_COLUMNS)
             if len(df_filter2)!=0:
                 st.markdown("***")
                 st.title(f'Topics Filtered')
-                st.table(df_filter2)
+                st.dataframe(df_filter2, hide_index=True, use_container_width=True)
             else:
                 st.markdown("***")
                 st.write("No topics added!")
@@ -234,10 +156,10 @@ def main():
 
         # Display the pie chart using Streamlit
         st.markdown("***")
-        counts = df.groupby('Category').size().reset_index(name='Count')
-        fig = px.pie(counts, values='Count', names='Category', title='Counts of Categories')
+        fig = category_chart()
         st.title('Topic Category Distribution')
-        st.plotly_chart(fig)  
+        with phase("render category chart"):
+            st.plotly_chart(fig)
 
     else:
         st.markdown("***")
@@ -246,4 +168,5 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    with profiled_run("Topic Assistant"), session_tenant():
+        main()
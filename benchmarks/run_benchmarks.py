@@ -0,0 +1,271 @@
+# Benchmarks for the database and rendering hot paths of both apps, on synthetic data.
+#
+#   python benchmarks/run_benchmarks.py --sizes 1000 100000 --output results.json
+#   python benchmarks/run_benchmarks.py --sizes 1000 100000 --compare results.json
+#
+# Each size runs in its own subprocess inside a scratch directory, so the apps' relative
+# database paths and per-process caches never leak between sizes. No Streamlit server is needed.
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REVISION_APP = os.path.join(ROOT, "Revision_Schedule_App", "Revision_Schedule.py")
+TOPIC_APP = os.path.join(ROOT, "Topic_Assistant", "Code.py")
+
+DEFAULT_SIZES = [1000, 100000, 1000000]
+# The pre-SQL pandas paths are kept as baselines but are too slow to run on the largest libraries
+LEGACY_LIMIT = 100000
+REVISION_PATTERN = [7, 14, 30, 60, 90]
+# Seconds an app run may take before AppTest gives up, generous for the first run on the largest libraries
+RERUN_TIMEOUT = 600
+CATEGORIES = ['ML', 'DL', 'NLP', 'CV', 'Stats', 'Technologies', 'Documentation']
+
+
+def load_app(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def timed(func, repeat):
+    runs = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        func(i)
+        runs.append(time.perf_counter() - start)
+    return {"min": min(runs), "median": statistics.median(runs), "runs": repeat}
+
+
+# Function to time reruns of an app script as the Streamlit server runs it, as __main__ with main() drawing the page.
+# The first run, which fills the caches, is left out.
+def app_reruns(path, repeat):
+    from streamlit.testing.v1 import AppTest
+    app = AppTest.from_file(path, default_timeout=RERUN_TIMEOUT)
+
+    def rerun(i):
+        app.run()
+        if app.exception:
+            raise RuntimeError(f"{os.path.basename(path)} failed: {app.exception[0].message}")
+    rerun(None)
+    return timed(rerun, repeat)
+
+
+# Function to fill revision_schedule.db with size topics and five revisions each
+def generate_revisions(db, size, rng):
+    from core.db import transaction
+    from core.revision_schema import to_day
+    today = to_day(date.today())
+    with transaction(db.db_path()) as conn:
+        conn.executemany("INSERT INTO topics (id, topic_name, entry_date) VALUES (?, ?, ?)",
+                         ((i, f"topic-{i}", today - rng.randrange(365)) for i in range(1, size + 1)))
+        entry_dates = dict(conn.execute("SELECT id, entry_date FROM topics"))
+
+        def revisions():
+            for topic_id, entry_date in entry_dates.items():
+                due = entry_date
+                for revision_no, after_days in enumerate(REVISION_PATTERN, 1):
+                    due += after_days
+                    yield topic_id, revision_no, due, int(due < today)
+
+        conn.executemany("INSERT INTO revisions (topic_id, revision_no, due_date, done) VALUES (?, ?, ?, ?)",
+                         revisions())
+
+
+# Function to fill topic.db with size topics spread over the categories
+def generate_topics(db, size, rng):
+    from core.db import transaction
+    from core.ordering import POSITION_GAP
+    with transaction(db.db_path()) as conn:
+        conn.executemany("INSERT INTO topics (position, topic_name, category, resource) VALUES (?, ?, ?, ?)",
+                         ((i * POSITION_GAP, f"topic-{i}", CATEGORIES[rng.randrange(len(CATEGORIES))],
+                           f"resource {rng.randrange(size)} notes") for i in range(size)))
+
+
+# Legacy date filter: build the DataFrame and scan every cell, as the revision apps used to
+def legacy_date_filter(topics, columns, filter_date):
+    import pandas as pd
+    df = pd.DataFrame(topics, columns=columns)
+    matched = []
+    for index, row in df.iterrows():
+        for col_name, col_value in row.iteritems():
+            if col_name != "Topic Name" and col_value == filter_date:
+                matched.append((row["Topic Name"], col_name))
+    return matched
+
+
+# Legacy category counts: build the sorted DataFrame of the whole library and group it, as the Topic Assistant used to
+def legacy_category_groupby(topics):
+    import pandas as pd
+    df = pd.DataFrame(topics, columns=["Position", "Topic Name", "Category", "Resource"])
+    df.sort_values(by=['Category', 'Position'], inplace=True)
+    return df.groupby('Category').size()
+
+
+# Function to insert topics from several threads at once, the way concurrent sessions do.
+# With tenants each session belongs to a different user and writes to that user's own database.
+def concurrent_inserts(db, run, sessions=16, per_session=100, tenants=False):
+    import threading
+    from core.tenants import tenant
+
+    def session(s):
+        with tenant(f"bench-{s}" if tenants else None):
+            for n in range(per_session):
+                db.insert_topic(0, f"concurrent-{run}-{s}-{n}", CATEGORIES[0], "bench")
+
+    threads = [threading.Thread(target=session, args=(s,)) for s in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+# Function to send requests concurrent GET requests to the HTTP API served in this process
+def api_requests(path, requests=1000):
+    import asyncio
+    from tornado.httpclient import AsyncHTTPClient
+    from tornado.httpserver import HTTPServer
+    from tornado.testing import bind_unused_port
+    from core import api
+
+    async def run():
+        sock, port = bind_unused_port()
+        server = HTTPServer(api.make_app())
+        server.add_sockets([sock])
+        client = AsyncHTTPClient(max_clients=64)
+        await asyncio.gather(*[client.fetch(f"http://{api.DEFAULT_HOST}:{port}{path}") for _ in range(requests)])
+        server.stop()
+    asyncio.run(run())
+
+
+def run_size(size, repeat, seed):
+    import streamlit.logger
+    streamlit.logger.set_log_level("error")
+    sys.path.insert(0, ROOT)
+    rng = random.Random(seed)
+    results = {}
+
+    start = time.perf_counter()
+    revision = load_app("revision_app", REVISION_APP)
+    results["revision.cold_import"] = time.perf_counter() - start
+    # Data access lives in the shared core; the apps only add their DataFrames and charts on top
+    from core import revisions as revision_db, topics as topic_db
+    generate_revisions(revision_db, size, rng)
+    generate_topics(topic_db, size, rng)
+    # Streamlit re-executes the whole script, main() included, on every interaction
+    results["revision.app_rerun"] = app_reruns(REVISION_APP, repeat)
+    results["topic.app_rerun"] = app_reruns(TOPIC_APP, repeat)
+
+    # Reads are timed through __wrapped__ so the versioned cache never answers them
+    retrieve_revisions = revision_db.retrieve_topics.__wrapped__
+    filter_date = date.today() + timedelta(days=30)
+    topics = retrieve_revisions()
+
+    results["revision.retrieve_topics"] = timed(lambda i: retrieve_revisions(), repeat)
+    results["revision.insert_topic"] = timed(
+        lambda i: revision_db.insert_topic(f"bench-{i}", date.today(), [date.today()] * 5), repeat)
+    results["revision.remove_entry_by_topic"] = timed(
+        lambda i: revision_db.remove_entry_by_topic(f"bench-{i}"), repeat)
+    results["revision.date_filter"] = timed(
+        lambda i: revision_db.retrieve_topics_due_on.__wrapped__(filter_date), repeat)
+    if size <= LEGACY_LIMIT:
+        results["revision.date_filter_iterrows"] = timed(
+            lambda i: legacy_date_filter(topics, revision.TOPIC_COLUMNS, filter_date), 1)
+    results["revision.generate_revision_chart"] = timed(
+        lambda i: revision.generate_revision_chart(topics).to_json(), repeat)
+    results["revision.chart_payload_bytes"] = len(revision.generate_revision_chart(topics).to_json())
+
+    retrieve_topics = topic_db.retrieve_topics.__wrapped__
+    category = CATEGORIES[0]
+    results["topic.retrieve_topics"] = timed(lambda i: retrieve_topics(), repeat)
+    results["topic.insert_topic"] = timed(
+        lambda i: topic_db.insert_topic(topic_db.get_max_position(category), f"bench-{i}", category, "bench"), repeat)
+    results["topic.reorder_topic"] = timed(lambda i: topic_db.reorder_topic(f"bench-{i}", i), repeat)
+    results["topic.remove_entry_by_topic"] = timed(lambda i: topic_db.remove_entry_by_topic(f"bench-{i}"), repeat)
+    results["topic.insert_rows"] = timed(
+        lambda i: topic_db.insert_rows([(0, f"bench-rows-{i}-{n}", category, "bench") for n in range(1000)]), repeat)
+    results["topic.concurrent_inserts_16x100"] = timed(lambda i: concurrent_inserts(topic_db, i), repeat)
+    results["topic.tenant_inserts_16x100"] = timed(lambda i: concurrent_inserts(topic_db, i, tenants=True), repeat)
+    results["topic.category_counts"] = timed(lambda i: topic_db.category_counts.__wrapped__(), repeat)
+    results["api.due_1000_requests"] = timed(lambda i: api_requests(f"/revisions/due?date={filter_date}"), repeat)
+    results["api.search_1000_requests"] = timed(lambda i: api_requests("/topics/search?q=resource"), repeat)
+    if size <= LEGACY_LIMIT:
+        library = topic_db.retrieve_topics()
+        results["topic.category_groupby"] = timed(lambda i: legacy_category_groupby(library), repeat)
+    return results
+
+
+# Function to print the change of every timing against an earlier results file, using the fastest run
+def compare(baseline, current, threshold):
+    regressions = 0
+    print(f"{'benchmark':45} {'size':>9} {'baseline':>12} {'current':>12} {'change':>9}")
+    for size, results in current["results"].items():
+        for name, value in results.items():
+            old = baseline["results"].get(size, {}).get(name)
+            if old is None:
+                continue
+            old_value = old["min"] if isinstance(old, dict) else old
+            new_value = value["min"] if isinstance(value, dict) else value
+            change = (new_value - old_value) / old_value if old_value else 0.0
+            flag = ""
+            if change > threshold:
+                flag = "  REGRESSION"
+                regressions += 1
+            elif change < -threshold:
+                flag = "  improved"
+            print(f"{name:45} {size:>9} {old_value:12.6g} {new_value:12.6g} {change:+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Revision Schedule and Topic Assistant hot paths.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="number of topics per run")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="compare against an earlier results JSON file")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change reported as a regression")
+    parser.add_argument("--worker-size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker_size is not None:
+        json.dump(run_size(args.worker_size, args.repeat, args.seed), sys.stdout)
+        return
+
+    current = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(),
+                 "repeat": args.repeat, "seed": args.seed, "timestamp": time.time()},
+        "results": {},
+    }
+    for size in args.sizes:
+        print(f"Running {size} topics...", file=sys.stderr)
+        with tempfile.TemporaryDirectory() as workdir:
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker-size", str(size),
+                                  "--repeat", str(args.repeat), "--seed", str(args.seed)],
+                                 cwd=workdir, check=True, capture_output=True, text=True)
+        current["results"][str(size)] = json.loads(out.stdout)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(baseline, current, args.threshold):
+            sys.exit(1)
+    elif not args.output:
+        json.dump(current, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# Shared helpers used by the Revision Schedule and Topic Assistant apps
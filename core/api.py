@@ -0,0 +1,173 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date
+
+import tornado.web
+
+from core import revisions, topics
+from core.scheduler import DEFAULT_PATTERN, make_strategy
+from core.tenants import QUERY_PARAM, check_user, tenant
+
+# Local HTTP/JSON API over the shared core, for scripts, shortcuts and reminder jobs that should not
+# have to drive the Streamlit UI. Tornado ships with Streamlit, so this needs no extra dependency.
+# Requests are routed to a user's databases by the X-User header or the ?user= parameter, as in the apps.
+# Handlers are async; the blocking SQLite work runs on WORKER_THREADS threads, reads are answered from the
+# versioned caches and writes from concurrent requests are group-committed by the writer queue.
+#
+#   POST /revisions        {"topics": [{"topic": "...", "entry_date": "YYYY-MM-DD"}], "scheduler": "...", "pattern": [7, 14, 30, 60, 90]}
+#   POST /revisions/done   {"revisions": [{"topic": "...", "revision": 1}], "done_date": "YYYY-MM-DD", "scheduler": "...", "pattern": [...]}
+#   GET  /revisions/due?date=YYYY-MM-DD&date=...
+#   POST /topics           {"topics": [{"topic": "...", "category": "...", "resource": "..."}]}
+#   GET  /topics/search?q=...&limit=50
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+USER_HEADER = "X-User"
+WORKER_THREADS = 16
+# Most items accepted in one batch request
+MAX_BATCH_ITEMS = 10000
+MAX_SEARCH_LIMIT = 1000
+# JSON types accepted for item fields, named as in error messages
+JSON_TYPES = {str: "a string", int: "an integer"}
+
+_executor = ThreadPoolExecutor(max_workers=WORKER_THREADS, thread_name_prefix="api")
+
+
+class ApiError(tornado.web.HTTPError):
+    def __init__(self, status_code, message):
+        super().__init__(status_code)
+        self.message = message
+
+
+# Turn malformed input found while reading a request into a 400 response
+@contextmanager
+def invalid_request():
+    try:
+        yield
+    except KeyError as e:
+        raise ApiError(400, f"Invalid request: missing field {e}")
+    except (TypeError, ValueError, AttributeError) as e:
+        raise ApiError(400, f"Invalid request: {e}")
+
+
+def _date(value):
+    return date.fromisoformat(value) if value else date.today()
+
+
+# Function to read one field of a request item, checking its JSON type so that a wrong type is a 400
+# rather than a database error. A missing or null optional field reads as None.
+def _field(item, key, kind, required=True):
+    if not isinstance(item, dict):
+        raise TypeError("every item must be an object")
+    value = item.get(key)
+    if value is None:
+        if required:
+            raise KeyError(key)
+        return None
+    # bool is a subclass of int, but true is not a revision number
+    if not isinstance(value, kind) or isinstance(value, bool):
+        raise TypeError(f"{key} must be {JSON_TYPES[kind]}, not {json.dumps(value)}")
+    return value
+
+
+class ApiHandler(tornado.web.RequestHandler):
+    def prepare(self):
+        user = self.request.headers.get(USER_HEADER) or self.get_query_argument(QUERY_PARAM, "")
+        with invalid_request():
+            self.user = check_user(user.strip().lower() or None)
+
+    def write_error(self, status_code, **kwargs):
+        error = kwargs.get("exc_info", (None, None, None))[1]
+        self.finish({"error": getattr(error, "message", None) or getattr(error, "log_message", None) or self._reason})
+
+    # Function to read the JSON body and its list of items under key
+    def batch(self, key):
+        with invalid_request():
+            body = json.loads(self.request.body or b"{}")
+            items = body[key]
+            if not isinstance(items, list):
+                raise TypeError(f"{key} must be a list")
+        if len(items) > MAX_BATCH_ITEMS:
+            raise ApiError(413, f"At most {MAX_BATCH_ITEMS} {key} per request")
+        return body, items
+
+    # Run func(*args) for this request's user on the worker threads
+    async def run(self, func, *args):
+        def call():
+            with tenant(self.user):
+                return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(_executor, call)
+
+
+class AddRevisionsHandler(ApiHandler):
+    async def post(self):
+        body, items = self.batch("topics")
+        with invalid_request():
+            strategy = make_strategy(body.get("scheduler", "Fixed interval"), body.get("pattern", DEFAULT_PATTERN))
+            added = [(_field(item, "topic", str).strip(), _date(_field(item, "entry_date", str, required=False)))
+                     for item in items]
+            if not all(topic_name for topic_name, entry_date in added):
+                raise ValueError("topic names must not be empty")
+        self.write({"added": await self.run(revisions.add_topics, added, strategy)})
+
+
+class RevisionsDoneHandler(ApiHandler):
+    async def post(self):
+        body, items = self.batch("revisions")
+        with invalid_request():
+            strategy = make_strategy(body.get("scheduler", "Fixed interval"), body.get("pattern", DEFAULT_PATTERN))
+            done = [(_field(item, "topic", str), _field(item, "revision", int)) for item in items]
+            done_date = _date(body.get("done_date"))
+        self.write({"updated": await self.run(revisions.mark_revisions_done, done, strategy, done_date)})
+
+
+class RevisionsDueHandler(ApiHandler):
+    async def get(self):
+        with invalid_request():
+            days = [str(_date(value)) for value in self.get_query_arguments("date")] or [str(date.today())]
+
+        def due():
+            return {day: revisions.retrieve_revisions_due_on(day) for day in days}
+        self.write({day: [{"topic": topic_name, "revision": revision_no, "done": bool(done)}
+                          for topic_name, revision_no, done in rows]
+                    for day, rows in (await self.run(due)).items()})
+
+
+class AddTopicsHandler(ApiHandler):
+    async def post(self):
+        body, items = self.batch("topics")
+        with invalid_request():
+            rows = [(_field(item, "topic", str).strip(), _field(item, "category", str),
+                     _field(item, "resource", str, required=False) or "") for item in items]
+            if not all(topic_name and category for topic_name, category, resource in rows):
+                raise ValueError("topic names and categories must not be empty")
+        skipped = await self.run(topics.add_topics, rows)
+        self.write({"added": len(rows) - len(skipped), "skipped": skipped})
+
+
+class SearchTopicsHandler(ApiHandler):
+    async def get(self):
+        with invalid_request():
+            text = self.get_query_argument("q")
+            limit = min(max(int(self.get_query_argument("limit", topics.SEARCH_LIMIT)), 1), MAX_SEARCH_LIMIT)
+        rows = await self.run(topics.search_topics, text, limit)
+        self.write({"topics": [{"position": position, "topic": topic_name, "category": category, "resource": resource}
+                               for position, topic_name, category, resource in rows]})
+
+
+# Function to build the Tornado application with every endpoint
+def make_app():
+    return tornado.web.Application([
+        (r"/revisions", AddRevisionsHandler),
+        (r"/revisions/done", RevisionsDoneHandler),
+        (r"/revisions/due", RevisionsDueHandler),
+        (r"/topics", AddTopicsHandler),
+        (r"/topics/search", SearchTopicsHandler),
+    ])
+
+
+# Serve the API until the process is stopped; it binds to localhost unless told otherwise
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT):
+    make_app().listen(port, address=host)
+    await asyncio.Event().wait()
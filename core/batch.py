@@ -0,0 +1,53 @@
+from datetime import date
+
+from core.instrument import timed
+from core.revision_schema import to_day
+from core.scheduler import _reschedule, complete_revisions
+from core.writer import write
+
+# Batch mutations on (topic name, revision number) pairs from the revision schedule.
+# Each call is one request to the database's writer no matter how many pairs it is given.
+
+_REVISION_ROW = "revision_no = ? AND topic_id = (SELECT id FROM topics WHERE topic_name = ?)"
+
+
+def _params(items, *extra):
+    return [extra + (revision_no, topic_name) for topic_name, revision_no in items]
+
+
+# Function to mark revisions done and move the rest of each topic's schedule
+def mark_done(db_path, items, strategy, done_date=None):
+    complete_revisions(db_path, strategy, items, done_date)
+
+
+# Function to mark revisions not done again and schedule the topics' later revisions from the previous completion
+@timed("undo_done")
+def undo_done(db_path, items, strategy):
+    items = list(items)
+
+    def apply(conn):
+        conn.executemany(f"UPDATE revisions SET done = 0, done_date = NULL WHERE {_REVISION_ROW}", _params(items))
+        _reschedule(conn, strategy, sorted({topic_name for topic_name, revision_no in items}),
+                    date.today(), catch_up=False)
+    write(db_path, apply)
+
+
+# Function to move revisions to a new due date
+@timed("reschedule_items")
+def reschedule_items(db_path, items, due_date):
+    def apply(conn):
+        conn.executemany(f"UPDATE revisions SET due_date = ? WHERE {_REVISION_ROW}", _params(items, to_day(due_date)))
+    write(db_path, apply)
+
+
+# Function to delete revisions, and any topic left without revisions
+@timed("delete_items")
+def delete_items(db_path, items):
+    items = list(items)
+
+    def apply(conn):
+        conn.executemany(f"DELETE FROM revisions WHERE {_REVISION_ROW}", _params(items))
+        conn.executemany('''DELETE FROM topics WHERE topic_name = ?
+                            AND NOT EXISTS (SELECT 1 FROM revisions WHERE topic_id = topics.id)''',
+                         [(topic_name,) for topic_name in {topic_name for topic_name, revision_no in items}])
+    write(db_path, apply)
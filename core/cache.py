@@ -0,0 +1,64 @@
+import functools
+import threading
+from collections import OrderedDict
+
+from core.db import data_version
+
+
+# Function to get the data version of db_path, which changes with every commit made to it by any process
+def get_version(db_path):
+    return data_version(db_path)
+
+
+# Decorator that memoizes a read until the next write to db_path, made in this process or any other.
+# db_path may also be a function returning the database of the caller (see core.tenants);
+# the resolved path is then part of the key, so every database has its own entries.
+# Only the current version is kept: each argument tuple has one entry, and every entry of a database
+# is dropped as soon as a newer version of it is seen, so stale results are never held in memory.
+# At most maxsize entries are kept in all, and with per_path at most that many for each database file,
+# so large values such as exports cannot evict the entries of other users.
+# Cached values are shared between sessions, so callers must not mutate them in place.
+def versioned(db_path, maxsize=32, per_path=None):
+    resolve = db_path if callable(db_path) else lambda: db_path
+
+    def decorator(func):
+        entries = OrderedDict()
+        seen = {}
+        lock = threading.Lock()
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            path = resolve()
+            version = get_version(path)
+            key = (path,) + args
+            with lock:
+                if seen.get(path) != version:
+                    seen[path] = version
+                    for stale in [k for k in entries if k[0] == path]:
+                        del entries[stale]
+                entry = entries.get(key)
+                if entry is not None and entry[0] == version:
+                    entries.move_to_end(key)
+                    return entry[1]
+            value = func(*args)
+            with lock:
+                # Only store the result if no write has been seen while it was computed
+                if seen.get(path) == version:
+                    entries[key] = (version, value)
+                    entries.move_to_end(key)
+                    if per_path is not None:
+                        own = [k for k in entries if k[0] == path]
+                        for oldest in own[:len(own) - per_path]:
+                            del entries[oldest]
+                    while len(entries) > maxsize:
+                        entries.popitem(last=False)
+            return value
+
+        def cache_clear():
+            with lock:
+                entries.clear()
+                seen.clear()
+
+        wrapper.cache_clear = cache_clear
+        return wrapper
+    return decorator
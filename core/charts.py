@@ -0,0 +1,105 @@
+from collections import Counter
+from datetime import timedelta
+
+# plotly is imported inside each function so scripts only pay for it when a chart is drawn
+
+# Above this many topics the chart shows revisions per day instead of one line per topic
+AGGREGATE_THRESHOLD = 500
+
+
+# Function to draw the revision schedule for many topics.
+# revision_dates holds one sequence of ISO dates per topic; date_window is an optional (start, end) pair.
+def revision_chart(topic_names, revision_dates, aggregate_threshold=AGGREGATE_THRESHOLD, date_window=None):
+    import plotly.graph_objects as go
+    if date_window is not None:
+        start, end = str(date_window[0]), str(date_window[1])
+        revision_dates = [[d if d is not None and start <= str(d) <= end else None for d in dates]
+                          for dates in revision_dates]
+
+    if len(topic_names) > aggregate_threshold:
+        return workload_chart(revision_dates)
+
+    # All topics go into a single WebGL trace; None entries break the line between topics
+    x, y, hover = [], [], []
+    for topic_name, dates in zip(topic_names, revision_dates):
+        if all(d is None for d in dates):
+            continue
+        for revision_no, revision_date in enumerate(dates, 1):
+            x.append(revision_date)
+            y.append(revision_no if revision_date is not None else None)
+            hover.append(topic_name)
+        x.append(None)
+        y.append(None)
+        hover.append(None)
+
+    revision_numbers = list(range(1, 6))
+    fig = go.Figure(go.Scattergl(x=x, y=y, hovertext=hover, mode='lines+markers',
+                                 hovertemplate="%{hovertext}<br>%{x}<br>Revision %{y}<extra></extra>"))
+    fig.update_layout(
+        title="Revision Schedule",
+        xaxis_title="Revision Date",
+        yaxis_title="Revision Number",
+        xaxis=dict(tickformat="%Y-%m-%d"),
+        yaxis=dict(tickvals=revision_numbers, ticktext=["Revision " + str(i) for i in revision_numbers]),
+        showlegend=False
+    )
+    return fig
+
+
+# Function to draw the number of revisions due on each day
+def workload_chart(revision_dates):
+    import plotly.graph_objects as go
+    load = Counter(str(d) for dates in revision_dates for d in dates if d is not None)
+    days = sorted(load)
+    fig = go.Figure(go.Bar(x=days, y=[load[day] for day in days]))
+    fig.update_layout(
+        title="Revisions per Day",
+        xaxis_title="Revision Date",
+        yaxis_title="Revisions Due",
+        xaxis=dict(tickformat="%Y-%m-%d"),
+        showlegend=False
+    )
+    return fig
+
+
+# Function to draw pending revisions per day as a calendar, one column per week starting on start (a Monday).
+# load maps ISO dates to the number of revisions due that day.
+def calendar_heatmap(load, start, weeks):
+    import plotly.graph_objects as go
+    days = [[start + timedelta(weeks=week, days=weekday) for week in range(weeks)] for weekday in range(7)]
+    fig = go.Figure(go.Heatmap(
+        z=[[load.get(str(day), 0) for day in row] for row in days],
+        x=[str(start + timedelta(weeks=week)) for week in range(weeks)],
+        y=["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"],
+        text=[[str(day) for day in row] for row in days],
+        hovertemplate="%{text}<br>%{z} revisions<extra></extra>",
+        colorscale="Greens", xgap=2, ygap=2
+    ))
+    fig.update_layout(
+        title="Revisions Due by Day",
+        xaxis_title="Week Starting",
+        yaxis=dict(autorange="reversed")
+    )
+    return fig
+
+
+# Function to draw the forecast daily load of several scenarios, one line each.
+# loads has one row per label and one column per day from start.
+def forecast_chart(labels, loads, start):
+    import plotly.graph_objects as go
+    days = [start + timedelta(days=day) for day in range(loads.shape[1])]
+    fig = go.Figure([go.Scattergl(x=days, y=row, mode='lines', name=label) for label, row in zip(labels, loads)])
+    fig.update_layout(
+        title="Forecast Revisions per Day",
+        xaxis_title="Date",
+        yaxis_title="Revisions Due",
+        xaxis=dict(tickformat="%Y-%m-%d")
+    )
+    return fig
+
+
+# Function to draw the share of each category from (category, count) pairs
+def category_pie(counts):
+    import plotly.express as px
+    return px.pie(names=[category for category, count in counts], values=[count for category, count in counts],
+                  title='Counts of Categories')
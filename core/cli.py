@@ -0,0 +1,100 @@
+# Command line access to the shared core, for scripts and cron jobs. Run from the directory holding the databases:
+#
+#   python -m core.cli due [DATE ...]
+#   python -m core.cli add "Topic" ... [--date YYYY-MM-DD] [--scheduler SM-2] [--pattern "7, 14, 30, 60, 90"]
+#   python -m core.cli done "Topic:2" ...
+#   python -m core.cli search "text" [--limit 50]
+#   python -m core.cli serve [--host 127.0.0.1] [--port 8765]
+#
+# --user routes every command to that user's databases, as ?user= does in the apps.
+import argparse
+import asyncio
+from datetime import date
+
+from core import api, revisions, topics
+from core.scheduler import DEFAULT_PATTERN, STRATEGIES, make_strategy
+from core.tenants import check_user, tenant
+
+
+def _revision(text):
+    topic_name, _, revision_no = text.rpartition(":")
+    if not topic_name or not revision_no.isdigit():
+        raise argparse.ArgumentTypeError(f"expected TOPIC:REVISION, got {text!r}")
+    return topic_name, int(revision_no)
+
+
+def due(args):
+    for day in args.dates or [date.today()]:
+        for topic_name, revision_no, done in revisions.retrieve_revisions_due_on(str(day)):
+            print("\t".join([str(day), topic_name, f"Revision {revision_no}"] + (["(done)"] if done else [])))
+
+
+def add(args):
+    added = revisions.add_topics([(topic_name, args.date) for topic_name in args.topics], args.strategy)
+    print(f"{added} topics added")
+
+
+def done(args):
+    updated = revisions.mark_revisions_done(args.revisions, args.strategy, args.date)
+    print(f"{updated} revisions marked done")
+
+
+def search(args):
+    for position, topic_name, category, resource in topics.search_topics(args.text, args.limit):
+        print(f"{topic_name}\t{category}\t{position}\t{resource}")
+
+
+def serve(args):
+    print(f"Serving on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(api.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m core.cli", description="Revision schedule and topic library tools.")
+    parser.add_argument("--user", help="work on this user's databases instead of the shared ones")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    schedule = argparse.ArgumentParser(add_help=False)
+    schedule.add_argument("--scheduler", choices=list(STRATEGIES), default="Fixed interval")
+    schedule.add_argument("--pattern", default=", ".join(map(str, DEFAULT_PATTERN)), help="days between revisions")
+
+    command = commands.add_parser("due", help="list the revisions due on dates (default today)")
+    command.add_argument("dates", nargs="*", type=date.fromisoformat, metavar="DATE")
+    command.set_defaults(func=due)
+
+    command = commands.add_parser("add", parents=[schedule], help="add topics to the revision schedule")
+    command.add_argument("topics", nargs="+", metavar="TOPIC")
+    command.add_argument("--date", type=date.fromisoformat, default=date.today(), help="entry date (default today)")
+    command.set_defaults(func=add)
+
+    command = commands.add_parser("done", parents=[schedule], help="mark revisions done")
+    command.add_argument("revisions", nargs="+", type=_revision, metavar="TOPIC:REVISION")
+    command.add_argument("--date", type=date.fromisoformat, default=date.today(), help="completion date (default today)")
+    command.set_defaults(func=done)
+
+    command = commands.add_parser("search", help="search the topic library")
+    command.add_argument("text")
+    command.add_argument("--limit", type=int, default=topics.SEARCH_LIMIT)
+    command.set_defaults(func=search)
+
+    command = commands.add_parser("serve", help="serve the HTTP/JSON API")
+    command.add_argument("--host", default=api.DEFAULT_HOST)
+    command.add_argument("--port", type=int, default=api.DEFAULT_PORT)
+    command.set_defaults(func=serve)
+
+    args = parser.parse_args(argv)
+    try:
+        user = check_user(args.user.strip().lower() if args.user else None)
+        if "scheduler" in args:
+            args.strategy = make_strategy(args.scheduler, args.pattern)
+    except ValueError as e:
+        parser.error(str(e))
+    with tenant(user):
+        args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import hashlib
+from collections import namedtuple
+
+import pandas as pd
+
+from core.instrument import timed
+from core.ordering import POSITION_GAP
+from core.sync import log_rows, log_suspended
+from core.topics import SYNC_TABLES, fts_suspended, stats_suspended
+from core.writer import write
+
+CHUNK_SIZE = 50000
+# Largest position a file may give: positions are stored times POSITION_GAP in a 64-bit SQLite integer
+MAX_POSITION = (2 ** 63 - 1) // POSITION_GAP
+
+# upserted: rows inserted or changed, unchanged: valid rows already up to date,
+# deleted: topics missing from the upload, rejected: (line number, reason) pairs
+ImportResult = namedtuple("ImportResult", ["upserted", "unchanged", "deleted", "rejected"])
+
+
+# Function to fingerprint an uploaded file so the same upload is only imported once
+def file_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+# Function to split a chunk of (position, topic name, category, resource) rows into valid rows and rejects.
+# Positions in the file are 0-based ranks within the category and are spread out to POSITION_GAP steps.
+# Also returns the topic names found on rejected rows, so the import can keep those topics.
+def validate_chunk(chunk, seen_names):
+    chunk = chunk.iloc[:, :4].copy()
+    chunk.columns = ["position", "topic_name", "category", "resource"]
+    # Header is line 1, so the first data row is line 2
+    lines = chunk.index + 2
+
+    position = pd.to_numeric(chunk["position"].str.strip(), errors="coerce")
+    topic_name = chunk["topic_name"].str.strip()
+    category = chunk["category"].str.strip()
+
+    reasons = pd.Series("", index=chunk.index)
+    reasons[position.abs() > MAX_POSITION] = "position is out of range"
+    reasons[position.isna() | (position % 1 != 0)] = "position is not an integer"
+    reasons[category == ""] = "missing category"
+    reasons[topic_name == ""] = "missing topic name"
+
+    rows, rejected, rejected_names = [], [], []
+    for line, reason, pos, name, cat, res in zip(lines, reasons, position, topic_name, category, chunk["resource"]):
+        if not reason and name in seen_names:
+            reason = "duplicate topic name"
+        if reason:
+            rejected.append((line, reason))
+            if name:
+                rejected_names.append(name)
+            continue
+        seen_names.add(name)
+        rows.append((int(pos) * POSITION_GAP, name, cat, res))
+    return rows, rejected, rejected_names
+
+
+# Function to import a topic CSV into the topics table of db_path in one transaction, run as an exclusive
+# request on the database's writer so other writes wait for it instead of failing on the lock.
+# Rows are upserted and topics missing from the file are deleted, so unchanged rows are never rewritten.
+# A topic named on a rejected row is left as it is rather than deleted.
+@timed("import_topics_csv")
+def import_topics_csv(db_path, file, chunk_size=CHUNK_SIZE):
+    def apply(conn):
+        reader = pd.read_csv(file, dtype=str, keep_default_na=False, chunksize=chunk_size)
+        upserted = valid = deleted = 0
+        rejected = []
+        seen_names = set()
+
+        c = conn.cursor()
+        # import_names: every name the file keeps; import_rows: the valid rows of one chunk;
+        # import_changed: the names of the rows written, new or different from the stored topic
+        c.execute("CREATE TEMP TABLE IF NOT EXISTS import_names (topic_name TEXT PRIMARY KEY)")
+        c.execute('''CREATE TEMP TABLE IF NOT EXISTS import_rows
+                     (position INTEGER, topic_name TEXT PRIMARY KEY, category TEXT, resource TEXT)''')
+        c.execute("CREATE TEMP TABLE IF NOT EXISTS import_changed (topic_name TEXT PRIMARY KEY)")
+        for table in ["import_names", "import_rows", "import_changed"]:
+            c.execute(f"DELETE FROM temp.{table}")
+
+        # The full-text index, category_stats and the change log are each brought up to date with one
+        # statement at the end rather than row by row through their triggers
+        with fts_suspended(conn, rebuild=True), stats_suspended(conn, recount=True), log_suspended(conn, SYNC_TABLES):
+            for chunk in reader:
+                if chunk.shape[1] < 4:
+                    raise ValueError("Expected Position, Topic Name, Category and Resource columns")
+                rows, chunk_rejected, rejected_names = validate_chunk(chunk, seen_names)
+                rejected.extend(chunk_rejected)
+                valid += len(rows)
+
+                c.execute("DELETE FROM temp.import_rows")
+                c.executemany("INSERT INTO temp.import_rows (position, topic_name, category, resource) VALUES (?, ?, ?, ?)",
+                              rows)
+                c.execute('''INSERT INTO temp.import_changed (topic_name)
+                             SELECT i.topic_name FROM temp.import_rows i LEFT JOIN topics t ON t.topic_name = i.topic_name
+                             WHERE t.topic_name IS NULL OR t.position IS NOT i.position
+                                OR t.category IS NOT i.category OR t.resource IS NOT i.resource''')
+                upserted += c.rowcount
+                # Unchanged rows are never rewritten
+                c.execute('''INSERT INTO topics (position, topic_name, category, resource)
+                             SELECT position, topic_name, category, resource FROM temp.import_rows
+                             WHERE topic_name IN (SELECT topic_name FROM temp.import_changed)
+                             ON CONFLICT(topic_name) DO UPDATE SET
+                                position = excluded.position, category = excluded.category, resource = excluded.resource''')
+                c.execute("INSERT OR IGNORE INTO temp.import_names (topic_name) SELECT topic_name FROM temp.import_rows")
+                c.executemany("INSERT OR IGNORE INTO temp.import_names (topic_name) VALUES (?)",
+                              [(name,) for name in rejected_names])
+
+            log_rows(conn, SYNC_TABLES[0], "upsert", "t.topic_name IN (SELECT topic_name FROM temp.import_changed)")
+            # An upload with no usable rows is treated as a mistake rather than a request to empty the table
+            if valid:
+                missing = "topic_name NOT IN (SELECT topic_name FROM temp.import_names)"
+                log_rows(conn, SYNC_TABLES[0], "delete", f"t.{missing}")
+                c.execute(f"DELETE FROM topics WHERE {missing}")
+                deleted = c.rowcount
+        for table in ["import_names", "import_rows", "import_changed"]:
+            c.execute(f"DROP TABLE temp.{table}")
+
+        return ImportResult(upserted, valid - upserted, deleted, rejected)
+
+    return write(db_path, apply, exclusive=True)
@@ -0,0 +1,160 @@
+import functools
+import itertools
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from core.instrument import ProfiledConnection, attach, current_run
+
+POOL_SIZE = 8
+BUSY_TIMEOUT_MS = 5000
+CACHED_STATEMENTS = 256
+# Database files (one per active user) kept open with a pool and a writer thread at once
+MAX_OPEN_DATABASES = 64
+
+
+# Numbers the probes, so the versions of a probe opened after an eviction never repeat those of its predecessor
+_probe_generations = itertools.count(1)
+
+
+# Decorator for process-wide objects such as pools and writer threads, created once per argument.
+# Unlike st.cache_resource it behaves the same outside a Streamlit run, and a hit is one dict lookup.
+# With maxsize only that many instances are kept: creating another one closes the least recently used.
+def process_wide(func=None, maxsize=None):
+    if func is None:
+        return functools.partial(process_wide, maxsize=maxsize)
+    instances = OrderedDict()
+    lock = threading.Lock()
+
+    @functools.wraps(func)
+    def wrapper(*args):
+        try:
+            instance = instances[args]
+        except KeyError:
+            with lock:
+                if args not in instances:
+                    instances[args] = func(*args)
+                    if maxsize is not None and len(instances) > maxsize:
+                        instances.popitem(last=False)[1].close()
+                return instances[args]
+        if maxsize is not None:
+            with lock:
+                if args in instances:
+                    instances.move_to_end(args)
+        return instance
+    return wrapper
+
+
+# Function to open a connection with the settings every connection to db_path shares
+def connect(db_path):
+    # check_same_thread is off because Streamlit runs each session on its own thread;
+    # a connection is only ever used by the thread that acquired it from the pool
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000, factory=ProfiledConnection,
+                           check_same_thread=False, cached_statements=CACHED_STATEMENTS)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    return conn
+
+
+# Pool of open SQLite connections to one database file, shared by every session in the process
+class ConnectionPool:
+    def __init__(self, db_path, size=POOL_SIZE):
+        self.db_path = db_path
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._closed = False
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return connect(self.db_path)
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        if self._closed:
+            conn.close()
+            return
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    # Close the idle connections; connections still borrowed are closed when they are released
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+# Function to get the process-wide pool for a database file
+@process_wide(maxsize=MAX_OPEN_DATABASES)
+def get_pool(db_path):
+    return ConnectionPool(db_path)
+
+
+# Borrow a pooled connection for reads
+@contextmanager
+def connection(db_path):
+    pool = get_pool(db_path)
+    conn = pool.acquire()
+    # Counts the statements and fetched rows of a profiled run; nothing otherwise
+    attach(conn, current_run())
+    try:
+        yield conn
+    finally:
+        attach(conn, None)
+        pool.release(conn)
+
+
+# Borrow a pooled connection and commit on success, roll back on error.
+# The write lock is taken up front so a read inside the transaction can never block its own later write.
+@contextmanager
+def transaction(db_path):
+    with connection(db_path) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+
+# Connection that never writes and only runs PRAGMA data_version, whose value changes whenever any other
+# connection commits to the file: the writer, a transaction, another process such as the CLI or API server
+class DataVersionProbe:
+    def __init__(self, db_path):
+        self.generation = next(_probe_generations)
+        self._conn = connect(db_path)
+        self._lock = threading.Lock()
+
+    def version(self):
+        with self._lock:
+            return self.generation, self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Function to get the process-wide data version probe for a database file
+@process_wide(maxsize=MAX_OPEN_DATABASES)
+def get_probe(db_path):
+    return DataVersionProbe(db_path)
+
+
+# Function to get a value that changes with every commit to db_path from any connection or process
+def data_version(db_path):
+    while True:
+        try:
+            return get_probe(db_path).version()
+        except sqlite3.ProgrammingError:
+            # Closed by an eviction between lookup and use; the next lookup opens a new probe
+            continue
@@ -0,0 +1,78 @@
+import csv
+import gzip
+import io
+from collections import namedtuple
+
+from core.db import connection
+from core.instrument import timed
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Rows pulled from the cursor at a time, so an export never holds the whole table in Python objects
+EXPORT_CHUNK_ROWS = 10000
+
+ExportFormat = namedtuple("ExportFormat", ["write", "extension", "mime"])
+
+
+def _chunks(cursor, chunk_rows):
+    while True:
+        rows = cursor.fetchmany(chunk_rows)
+        if not rows:
+            return
+        yield rows
+
+
+# Function to write the rows of a cursor as UTF-8 CSV with a header line to a binary file
+def write_csv(cursor, columns, out, chunk_rows=EXPORT_CHUNK_ROWS):
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="")
+    writer = csv.writer(text, lineterminator="\n")
+    writer.writerow(columns)
+    for rows in _chunks(cursor, chunk_rows):
+        writer.writerows(rows)
+    text.flush()
+    text.detach()
+
+
+# Function to write the rows of a cursor as gzip-compressed CSV to a binary file
+def write_csv_gzip(cursor, columns, out, chunk_rows=EXPORT_CHUNK_ROWS):
+    with gzip.GzipFile(fileobj=out, mode="wb") as compressed:
+        write_csv(cursor, columns, compressed, chunk_rows)
+
+
+# Function to write the rows of a cursor as Parquet, one row group per chunk.
+# Column types are taken from the first chunk; an empty result is written with string columns.
+def write_parquet(cursor, columns, out, chunk_rows=EXPORT_CHUNK_ROWS):
+    schema = None
+    writer = None
+    for rows in _chunks(cursor, chunk_rows):
+        values = list(zip(*rows))
+        if schema is None:
+            schema = pa.schema([(name, pa.array(column).type) for name, column in zip(columns, values)])
+            writer = pq.ParquetWriter(out, schema)
+        writer.write_batch(pa.RecordBatch.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(values, schema)], schema=schema))
+    if writer is None:
+        writer = pq.ParquetWriter(out, pa.schema([(name, pa.string()) for name in columns]))
+    writer.close()
+
+
+EXPORT_FORMATS = {
+    "CSV": ExportFormat(write_csv, "csv", "text/csv"),
+    "CSV (gzip)": ExportFormat(write_csv_gzip, "csv.gz", "application/gzip"),
+}
+if pa is not None:
+    EXPORT_FORMATS["Parquet"] = ExportFormat(write_parquet, "parquet", "application/vnd.apache.parquet")
+
+
+# Function to run a query on db_path and return its rows as a file in one of the EXPORT_FORMATS.
+# The rows are streamed from the cursor in chunks straight into the output.
+@timed("export_query")
+def export_query(db_path, sql, columns, export_format, params=(), chunk_rows=EXPORT_CHUNK_ROWS):
+    out = io.BytesIO()
+    with connection(db_path) as conn:
+        EXPORT_FORMATS[export_format].write(conn.execute(sql, params), columns, out, chunk_rows)
+    return out.getvalue()
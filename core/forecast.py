@@ -0,0 +1,102 @@
+import itertools
+import multiprocessing
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from core.db import connection
+from core.scheduler import DEFAULT_EASE, REVISIONS, STRATEGIES, _anchor_topics, _load_revisions
+
+# What-if forecasts of the daily revision load: the current topics plus new_per_day new topics every day,
+# scheduled with a candidate pattern, with every revision assumed to be done on the day it is due.
+
+Scenario = namedtuple("Scenario", ["strategy", "pattern", "new_per_day"])
+TopicState = namedtuple("TopicState", ["anchor", "last_done", "ease"])
+
+# Below this many scenarios the sweep runs in-process; starting worker processes would cost more
+MIN_PARALLEL = 16
+
+# Topic state of the current database, shared with each worker process once through the pool initializer
+_state = None
+
+
+def _init_worker(state):
+    global _state
+    _state = state
+
+
+# Function to read the current topics as day offsets from today, their last completed revision and ease
+def load_topic_state(db_path, today=None):
+    today = today or date.today()
+    with connection(db_path) as conn:
+        df = _load_revisions(conn, None)
+    if df.empty:
+        return TopicState(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0))
+    topic_ids, topic_index, anchor, last_done, ease = _anchor_topics(df)
+    offset = (anchor - np.datetime64(today, "D")).astype(np.int64)
+    return TopicState(offset, last_done, ease.astype(float))
+
+
+# Function to simulate one scenario: the number of revisions due on each of the next horizon days.
+# Overdue revisions of the current topics are counted on day 0.
+def simulate(scenario, horizon, state=None):
+    state = _state if state is None else state
+    strategy = STRATEGIES[scenario.strategy](scenario.pattern)
+
+    # Current topics: every revision after the last completed one, from the topic's anchor
+    cumulative = np.zeros((len(state.ease), REVISIONS + 1), dtype=np.int64)
+    cumulative[:, 1:] = np.cumsum(strategy.intervals(state.ease), axis=1)
+    pending = np.arange(1, REVISIONS + 1)[None, :] > state.last_done[:, None]
+    offsets = cumulative[:, 1:] - np.take_along_axis(cumulative, state.last_done[:, None], axis=1)
+    due = np.maximum((state.anchor[:, None] + offsets)[pending], 0)
+    load = np.bincount(due[due < horizon], minlength=horizon).astype(float)
+
+    # New topics: new_per_day enter on each day from today, so each revision adds a constant rate from its offset on
+    for offset in np.cumsum(strategy.intervals(np.array([DEFAULT_EASE]))[0]):
+        load[offset:] += scenario.new_per_day
+    return load
+
+
+def _simulate_chunk(args):
+    scenarios, horizon = args
+    return np.stack([simulate(scenario, horizon) for scenario in scenarios])
+
+
+# Function to build the grid of scenarios from candidate patterns and daily new-topic rates
+def scenario_grid(patterns, rates, strategy="Fixed interval"):
+    return [Scenario(strategy, tuple(pattern), rate) for pattern, rate in itertools.product(patterns, rates)]
+
+
+# Function to simulate every scenario over horizon days.
+# Returns a matrix with one row of daily loads per scenario, in the order given.
+# Large sweeps are split into chunks and fanned out over a process pool.
+def run_forecast(state, scenarios, horizon, max_workers=None):
+    if not scenarios:
+        return np.zeros((0, horizon))
+    if len(scenarios) < MIN_PARALLEL or max_workers == 1:
+        return np.stack([simulate(scenario, horizon, state) for scenario in scenarios])
+
+    workers = max_workers or os.cpu_count() or 1
+    chunk = -(-len(scenarios) // (workers * 4))
+    chunks = [(scenarios[i:i + chunk], horizon) for i in range(0, len(scenarios), chunk)]
+    # Streamlit and the writer queue run threads, which a plain fork would copy mid-flight
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method),
+                             initializer=_init_worker, initargs=(state,)) as pool:
+        return np.concatenate(list(pool.map(_simulate_chunk, chunks)))
+
+
+# Function to summarise each scenario's daily load: mean, 95th percentile and peak, lowest peak first
+def summarize(scenarios, loads):
+    summary = pd.DataFrame({
+        "Pattern": ["-".join(map(str, scenario.pattern)) for scenario in scenarios],
+        "New topics per day": [scenario.new_per_day for scenario in scenarios],
+        "Mean per day": loads.mean(axis=1) if len(loads) else [],
+        "95th percentile": np.percentile(loads, 95, axis=1) if len(loads) else [],
+        "Peak": loads.max(axis=1) if len(loads) else [],
+    })
+    return summary.sort_values(["Peak", "Mean per day"], kind="stable")
@@ -0,0 +1,225 @@
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Opt-in profiling of script runs: APP_PROFILE=1 in the environment profiles every run. ?profile=1 in the URL
+# profiles single runs, but only when the server was started with APP_PROFILE_URL=1, since anyone who can
+# open the app could otherwise slow the whole process down.
+# Each run is summarised in a collapsible sidebar panel and appended as one JSON line to PROFILE_LOG.
+ENV_VAR = "APP_PROFILE"
+QUERY_ENV_VAR = "APP_PROFILE_URL"
+QUERY_PARAM = "profile"
+PROFILE_LOG = os.environ.get("APP_PROFILE_LOG", "profile.jsonl")
+
+# Streamlit runs every session on its own thread, so the record of the current run is thread-local
+_current = threading.local()
+_log_lock = threading.Lock()
+
+# tracemalloc slows every thread of the process, so it only runs while at least one profiled run is active
+_tracing_runs = 0
+_tracing_started = False
+_tracing_lock = threading.Lock()
+
+
+class RunRecord:
+    def __init__(self, app):
+        self.app = app
+        self.started = time.time()
+        self.timings = {}
+        self.queries = 0
+        self.rows = 0
+
+    # Record one call of a step; rows are the rows fetched while it ran, already counted by the cursors
+    def add(self, name, seconds, rows=0):
+        calls, total, fetched = self.timings.get(name, (0, 0.0, 0))
+        self.timings[name] = (calls + 1, total + seconds, fetched + rows)
+
+    def count_statement(self, sql):
+        self.queries += 1
+
+
+def _active():
+    return getattr(_current, "record", None)
+
+
+def _env_flag(name):
+    return os.environ.get(name, "") not in ("", "0")
+
+
+# Function to tell whether profiling was asked for, by environment variable or (when allowed) query parameter
+def enabled():
+    if _env_flag(ENV_VAR):
+        return True
+    if not _env_flag(QUERY_ENV_VAR):
+        return False
+    try:
+        import streamlit as st
+        return st.query_params.get(QUERY_PARAM, "") not in ("", "0")
+    except Exception:
+        return False
+
+
+# Cursor that adds the rows it fetches to the run record its connection had when it was created
+class CountingCursor(sqlite3.Cursor):
+    record = None
+
+    def __next__(self):
+        row = super().__next__()
+        self.record.rows += 1
+        return row
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            self.record.rows += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = super().fetchmany(*args, **kwargs)
+        self.record.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self.record.rows += len(rows)
+        return rows
+
+
+# Connection (see core.db.connect) whose cursors count fetched rows while a profiled run is attached to it.
+# pandas creates its cursors through cursor(); Connection.execute does not, so it is routed there too.
+class ProfiledConnection(sqlite3.Connection):
+    record = None
+
+    def execute(self, sql, parameters=()):
+        if self.record is None:
+            return super().execute(sql, parameters)
+        return self.cursor().execute(sql, parameters)
+
+    def cursor(self, factory=sqlite3.Cursor):
+        if self.record is None:
+            return super().cursor(factory)
+        cursor = super().cursor(CountingCursor)
+        cursor.record = self.record
+        return cursor
+
+
+# Function to make conn count the statements it runs and the rows it fetches for record, or stop with None.
+# Reads attach the run of the session borrowing the connection; the writer attaches the run of each request.
+def attach(conn, record):
+    conn.record = record
+    conn.set_trace_callback(record.count_statement if record is not None else None)
+
+
+# Function to get the record of the current profiled run, or None, for work done for it on another thread
+def current_run():
+    return _active()
+
+
+# Decorator that times a data-access function and counts the rows fetched while it runs, nested calls included.
+# A call answered from a cache fetches nothing. Outside a profiled run it only costs one attribute lookup.
+def timed(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            record = _active()
+            if record is None:
+                return func(*args, **kwargs)
+            start, rows = time.perf_counter(), record.rows
+            result = func(*args, **kwargs)
+            record.add(name, time.perf_counter() - start, record.rows - rows)
+            return result
+        return wrapper
+    return decorator
+
+
+# Time a render phase of the current run
+@contextmanager
+def phase(name):
+    record = _active()
+    if record is None:
+        yield
+        return
+    start, rows = time.perf_counter(), record.rows
+    try:
+        yield
+    finally:
+        record.add(name, time.perf_counter() - start, record.rows - rows)
+
+
+def _write_log(entry):
+    with _log_lock, open(PROFILE_LOG, "a") as log:
+        log.write(json.dumps(entry) + "\n")
+
+
+def _show_panel(entry):
+    import pandas as pd
+    import streamlit as st
+    with st.sidebar.expander("Debug: performance", expanded=False):
+        st.write(f"Run took {entry['total_ms']:.1f} ms")
+        st.write(f"{entry['queries']} SQL statements, {entry['rows']} rows fetched, "
+                 f"peak memory {entry['peak_kb']:.0f} KiB")
+        st.dataframe(pd.DataFrame(entry["timings"], columns=["Step", "Calls", "Time (ms)", "Rows"]),
+                     hide_index=True)
+
+
+# Function to start tracing memory for a profiled run, unless other profiled runs already keep it on
+def _start_tracing():
+    global _tracing_runs, _tracing_started
+    with _tracing_lock:
+        if _tracing_runs == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing_started = True
+        _tracing_runs += 1
+        tracemalloc.reset_peak()
+
+
+# Function to stop tracing when the last profiled run has finished; tracing started elsewhere is left on
+def _stop_tracing():
+    global _tracing_runs, _tracing_started
+    with _tracing_lock:
+        _tracing_runs -= 1
+        if _tracing_runs == 0 and _tracing_started:
+            tracemalloc.stop()
+            _tracing_started = False
+
+
+# Profile one run of an app's main(): everything timed() or phase() inside it is collected,
+# SQL statements and returned rows are counted and peak Python memory is traced.
+# The panel is only drawn when the run finishes normally (not when it is interrupted by st.rerun).
+@contextmanager
+def profiled_run(app):
+    if not enabled():
+        yield
+        return
+
+    _start_tracing()
+    record = _current.record = RunRecord(app)
+    start = time.perf_counter()
+    finished = False
+    try:
+        yield
+        finished = True
+    finally:
+        total = time.perf_counter() - start
+        _current.record = None
+        entry = {
+            "app": app,
+            "timestamp": record.started,
+            "total_ms": total * 1000,
+            "completed": finished,
+            "queries": record.queries,
+            "rows": record.rows,
+            # tracemalloc is process-wide, so concurrent sessions inflate this number
+            "peak_kb": tracemalloc.get_traced_memory()[1] / 1024,
+            "timings": sorted(((name, calls, seconds * 1000, rows)
+                               for name, (calls, seconds, rows) in record.timings.items()),
+                              key=lambda timing: -timing[2]),
+        }
+        _stop_tracing()
+        _write_log(entry)
+    _show_panel(entry)
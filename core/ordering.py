@@ -0,0 +1,25 @@
+# Topics in a category are ordered by sparse integer positions spaced POSITION_GAP apart,
+# so a topic can be moved between two neighbours by rewriting only its own row.
+POSITION_GAP = 1024
+
+
+# Function to pick a position strictly between low and high (None means no neighbour on that side).
+# Returns None when the neighbours are adjacent and the category needs rebalancing.
+def position_between(low, high):
+    if low is None and high is None:
+        return 0
+    if low is None:
+        return high - POSITION_GAP
+    if high is None:
+        return low + POSITION_GAP
+    if high - low > 1:
+        return (low + high) // 2
+    return None
+
+
+# Function to spread the positions of one category back out to POSITION_GAP apart, keeping their order
+def rebalance_category(cursor, category):
+    ids = cursor.execute("SELECT id FROM topics WHERE category = ? ORDER BY position, id",
+                         (category,)).fetchall()
+    cursor.executemany("UPDATE topics SET position = ? WHERE id = ?",
+                       [(i * POSITION_GAP, topic_id) for i, (topic_id,) in enumerate(ids)])
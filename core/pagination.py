@@ -0,0 +1,23 @@
+import streamlit as st
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+
+# Function to show one page of a large table with page, page size and sort controls.
+# fetch_page(limit, offset, sort) returns only the rows of the requested page as a DataFrame,
+# and total is the full row count, so nothing outside the page is ever fetched or rendered.
+def paginated_table(key, total, fetch_page, sort_options=None, page_sizes=PAGE_SIZES):
+    cols = st.columns(3)
+    page_size = cols[0].selectbox("Rows per page", page_sizes, key=f"{key}_page_size")
+    sort = cols[1].selectbox("Sort by", sort_options, key=f"{key}_sort") if sort_options else None
+
+    pages = max(1, -(-total // page_size))
+    # Keep the page in range when rows were removed since the last rerun
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = pages
+    page = cols[2].number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, step=1,
+                                key=f"{key}_page")
+
+    offset = (page - 1) * page_size
+    st.caption(f"Showing {min(offset + 1, total)}-{min(offset + page_size, total)} of {total}")
+    st.dataframe(fetch_page(page_size, offset, sort), hide_index=True, use_container_width=True)
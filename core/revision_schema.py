@@ -0,0 +1,212 @@
+import functools
+from datetime import date
+
+from core.sync import TrackedTable, backfill_change_log, change_log_schema
+
+# Schema of revision_schedule.db, shared by both revision apps.
+# PRAGMA user_version records which of the MIGRATIONS below a database file has been through.
+SCHEMA_VERSION = 5
+
+# Dates are stored as whole days since EPOCH and converted by to_day/from_day at the data-access boundary
+EPOCH = date(1970, 1, 1)
+_EPOCH_ORDINAL = EPOCH.toordinal()
+
+
+def to_day(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    return value.toordinal() - _EPOCH_ORDINAL
+
+
+@functools.lru_cache(maxsize=65536)
+def from_day(day):
+    return None if day is None else date.fromordinal(int(day) + _EPOCH_ORDINAL)
+
+
+DAILY_LOAD_TRIGGERS = [
+    '''CREATE TRIGGER IF NOT EXISTS daily_load_insert AFTER INSERT ON revisions BEGIN
+         INSERT INTO daily_load (due_date, total, done) VALUES (new.due_date, 1, new.done)
+         ON CONFLICT(due_date) DO UPDATE SET total = total + 1, done = done + new.done;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS daily_load_delete AFTER DELETE ON revisions BEGIN
+         UPDATE daily_load SET total = total - 1, done = done - old.done WHERE due_date = old.due_date;
+         DELETE FROM daily_load WHERE due_date = old.due_date AND total = 0;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS daily_load_update AFTER UPDATE OF due_date, done ON revisions BEGIN
+         UPDATE daily_load SET total = total - 1, done = done - old.done WHERE due_date = old.due_date;
+         DELETE FROM daily_load WHERE due_date = old.due_date AND total = 0;
+         INSERT INTO daily_load (due_date, total, done) VALUES (new.due_date, 1, new.done)
+         ON CONFLICT(due_date) DO UPDATE SET total = total + 1, done = done + new.done;
+       END''',
+]
+
+# Deleting a topic deletes its revisions first, so no revision is left without its topic and the change log
+# still records each revision under its topic name (a sync from another copy deletes only the topic)
+TOPIC_TRIGGERS = [
+    '''CREATE TRIGGER IF NOT EXISTS topics_delete_revisions BEFORE DELETE ON topics BEGIN
+         DELETE FROM revisions WHERE topic_id = old.id;
+       END''',
+]
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_revisions_due_date ON revisions (due_date)",
+    "CREATE INDEX IF NOT EXISTS idx_revisions_pending ON revisions (due_date) WHERE done = 0",
+]
+
+# Rows tracked by the change log for syncing, matched between databases by topic name (and revision number)
+SYNC_TABLES = [
+    TrackedTable(
+        "topics",
+        key="json_object('topic_name', {r}.topic_name)",
+        row="json_object('topic_name', {r}.topic_name, 'entry_date', {r}.entry_date, 'ease', {r}.ease)",
+        upsert='''INSERT INTO topics (topic_name, entry_date, ease) VALUES (:topic_name, :entry_date, :ease)
+                  ON CONFLICT(topic_name) DO UPDATE SET entry_date = excluded.entry_date, ease = excluded.ease''',
+        delete="DELETE FROM topics WHERE topic_name = :topic_name"),
+    TrackedTable(
+        "revisions",
+        key="json_object('topic_name', (SELECT topic_name FROM topics WHERE id = {r}.topic_id), 'revision_no', {r}.revision_no)",
+        row='''json_object('topic_name', (SELECT topic_name FROM topics WHERE id = {r}.topic_id), 'revision_no', {r}.revision_no,
+                         'due_date', {r}.due_date, 'done', {r}.done, 'done_date', {r}.done_date)''',
+        # Inserts nothing when the topic does not exist here, for instance because it was deleted on this side
+        upsert='''INSERT INTO revisions (topic_id, revision_no, due_date, done, done_date)
+                  SELECT id, :revision_no, :due_date, :done, :done_date FROM topics WHERE topic_name = :topic_name
+                  ON CONFLICT(topic_id, revision_no) DO UPDATE SET
+                      due_date = excluded.due_date, done = excluded.done, done_date = excluded.done_date''',
+        delete='''DELETE FROM revisions WHERE revision_no = :revision_no
+                  AND topic_id = (SELECT id FROM topics WHERE topic_name = :topic_name)'''),
+]
+
+# Schema for a brand new database, already at SCHEMA_VERSION
+LATEST_SCHEMA = [
+    '''CREATE TABLE topics
+         (id INTEGER PRIMARY KEY AUTOINCREMENT,
+         topic_name TEXT UNIQUE NOT NULL,
+         entry_date INTEGER NOT NULL,
+         ease REAL NOT NULL DEFAULT 2.5)''',
+    '''CREATE TABLE revisions
+         (topic_id INTEGER NOT NULL REFERENCES topics(id),
+         revision_no INTEGER NOT NULL,
+         due_date INTEGER NOT NULL,
+         done INTEGER NOT NULL DEFAULT 0,
+         done_date INTEGER,
+         PRIMARY KEY (topic_id, revision_no))''',
+    '''CREATE TABLE daily_load
+         (due_date INTEGER PRIMARY KEY,
+         total INTEGER NOT NULL,
+         done INTEGER NOT NULL)''',
+] + INDEXES + DAILY_LOAD_TRIGGERS + TOPIC_TRIGGERS + change_log_schema(SYNC_TABLES)
+
+
+def _columns(conn, table):
+    return [col[1] for col in conn.execute(f"PRAGMA table_info({table})")]
+
+
+# Version 1: move the wide revision_1..revision_5 (and done_N) columns into the revisions table,
+# add the scheduler columns and the trigger-maintained daily_load totals. Dates are still ISO text.
+def _normalize_revisions(conn):
+    columns = _columns(conn, "topics")
+    if "revision_1" in columns:
+        revision_selects = []
+        for n in range(1, 6):
+            done_col = f"done_{n}" if f"done_{n}" in columns else "0"
+            revision_selects.append(f"SELECT id, {n}, revision_{n}, {done_col} FROM topics_wide")
+        conn.execute("ALTER TABLE topics RENAME TO topics_wide")
+        conn.execute('''CREATE TABLE topics
+                          (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                          topic_name TEXT UNIQUE NOT NULL,
+                          entry_date DATE NOT NULL)''')
+        conn.execute("INSERT INTO topics (id, topic_name, entry_date) SELECT id, topic_name, entry_date FROM topics_wide")
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS revisions
+                      (topic_id INTEGER NOT NULL REFERENCES topics(id),
+                      revision_no INTEGER NOT NULL,
+                      due_date DATE NOT NULL,
+                      done INTEGER NOT NULL DEFAULT 0,
+                      PRIMARY KEY (topic_id, revision_no))''')
+    if "revision_1" in columns:
+        conn.execute(f"INSERT INTO revisions (topic_id, revision_no, due_date, done) {' UNION ALL '.join(revision_selects)}")
+        conn.execute("DROP TABLE topics_wide")
+
+    if "ease" not in _columns(conn, "topics"):
+        conn.execute("ALTER TABLE topics ADD COLUMN ease REAL NOT NULL DEFAULT 2.5")
+    if "done_date" not in _columns(conn, "revisions"):
+        conn.execute("ALTER TABLE revisions ADD COLUMN done_date DATE")
+    for sql in INDEXES:
+        conn.execute(sql)
+
+    daily_load_exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'daily_load'").fetchone()
+    conn.execute('''CREATE TABLE IF NOT EXISTS daily_load
+                      (due_date DATE PRIMARY KEY,
+                      total INTEGER NOT NULL,
+                      done INTEGER NOT NULL)''')
+    for sql in DAILY_LOAD_TRIGGERS:
+        conn.execute(sql)
+    if not daily_load_exists:
+        conn.execute('''INSERT INTO daily_load (due_date, total, done)
+                        SELECT due_date, COUNT(*), SUM(done) FROM revisions GROUP BY due_date''')
+
+
+# Version 2: store every date as an integer day number instead of ISO text.
+# The columns keep their declared DATE type; its NUMERIC affinity stores the integers as integers.
+def _integer_days(conn):
+    day = "CAST(julianday({0}) - 2440587.5 AS INTEGER)"
+    conn.execute(f"UPDATE topics SET entry_date = {day.format('entry_date')} WHERE typeof(entry_date) = 'text'")
+    # Rebuild daily_load once instead of letting the update trigger move every row one at a time
+    conn.execute("DROP TRIGGER IF EXISTS daily_load_update")
+    conn.execute(f'''UPDATE revisions SET due_date = {day.format('due_date')},
+                       done_date = CASE WHEN done_date IS NULL THEN NULL ELSE {day.format('done_date')} END
+                     WHERE typeof(due_date) = 'text' ''')
+    conn.execute("DELETE FROM daily_load")
+    conn.execute('''INSERT INTO daily_load (due_date, total, done)
+                    SELECT due_date, COUNT(*), SUM(done) FROM revisions GROUP BY due_date''')
+    conn.execute(DAILY_LOAD_TRIGGERS[2])
+
+
+# Version 3: record every change of topics and revisions in the change log used for syncing
+def _change_log(conn):
+    for sql in change_log_schema(SYNC_TABLES):
+        conn.execute(sql)
+    backfill_change_log(conn, SYNC_TABLES)
+
+
+# Version 4: delete a topic's revisions together with it, and drop the revisions left behind by syncs that
+# deleted only the topic. Their deletes are kept out of the change log, since they have no topic name to sync by.
+def _cascade_topic_deletes(conn):
+    for sql in TOPIC_TRIGGERS:
+        conn.execute(sql)
+    before = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+    conn.execute("DELETE FROM revisions WHERE topic_id NOT IN (SELECT id FROM topics)")
+    conn.execute("DELETE FROM change_log WHERE seq > ?", (before,))
+
+
+# Version 5: remember when the change log was last compacted
+def _change_log_state(conn):
+    for sql in change_log_schema(SYNC_TABLES):
+        conn.execute(sql)
+
+
+MIGRATIONS = [_normalize_revisions, _integer_days, _change_log, _cascade_topic_deletes, _change_log_state]
+
+
+# Function to create or upgrade the schema of an open revision_schedule.db connection.
+# The pending steps run in one write transaction after re-checking the version, so concurrent callers are safe.
+def migrate(conn):
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'topics'").fetchone():
+            for sql in LATEST_SCHEMA:
+                conn.execute(sql)
+            version = SCHEMA_VERSION
+        for target in range(version + 1, SCHEMA_VERSION + 1):
+            MIGRATIONS[target - 1](conn)
+        conn.execute(f"PRAGMA user_version = {max(version, SCHEMA_VERSION)}")
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
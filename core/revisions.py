@@ -0,0 +1,246 @@
+from core.cache import versioned
+from core.charts import AGGREGATE_THRESHOLD, revision_chart
+from core.db import connection
+from core.forecast import load_topic_state, run_forecast, scenario_grid
+from core.instrument import timed
+from core.revision_schema import from_day, migrate, to_day
+from core.scheduler import complete_revisions, initial_schedule
+from core.tenants import tenant_path
+from core.writer import write
+
+# Queries and writes on revision_schedule.db, shared by the Revision Schedule app, the HTTP API and the CLI.
+# Every function works on the database of the current user (see core.tenants).
+
+DB_PATH = "revision_schedule.db"
+OVERDUE_LIMIT = 100
+# Most topic names offered by a topic picker at once
+PICKER_LIMIT = 50
+
+# Sort choices for the topic table, mapped to ORDER BY clauses over the topics table
+TOPIC_ORDER = {"Date added": "id", "Newest first": "id DESC",
+               "Topic name": "topic_name", "Topic name (Z-A)": "topic_name DESC"}
+
+# Pivot of the revisions rows into one column per revision, used as a SELECT list
+REVISION_COLUMNS_SQL = '''MAX(CASE WHEN r.revision_no = 1 THEN r.due_date END), MAX(CASE WHEN r.revision_no = 1 THEN r.done END),
+                          MAX(CASE WHEN r.revision_no = 2 THEN r.due_date END), MAX(CASE WHEN r.revision_no = 2 THEN r.done END),
+                          MAX(CASE WHEN r.revision_no = 3 THEN r.due_date END), MAX(CASE WHEN r.revision_no = 3 THEN r.done END),
+                          MAX(CASE WHEN r.revision_no = 4 THEN r.due_date END), MAX(CASE WHEN r.revision_no = 4 THEN r.done END),
+                          MAX(CASE WHEN r.revision_no = 5 THEN r.due_date END), MAX(CASE WHEN r.revision_no = 5 THEN r.done END)'''
+
+
+# Function to create or upgrade the database schema
+def create_table(path):
+    with connection(path) as conn:
+        migrate(conn)
+
+
+# Function to get the database file of the current user, created or upgraded on first use
+def db_path():
+    return tenant_path(DB_PATH, setup=create_table)
+
+
+def _upsert_topic(c, topic_name, entry_date, revision_dates):
+    upserted = c.execute('''INSERT INTO topics (topic_name, entry_date) VALUES (?, ?)
+                    ON CONFLICT(topic_name) DO UPDATE SET entry_date = excluded.entry_date''',
+              (topic_name, to_day(entry_date))).rowcount
+    topic_id = c.execute("SELECT id FROM topics WHERE topic_name=?", (topic_name,)).fetchone()[0]
+    # An upsert rather than INSERT OR REPLACE, so the daily_load triggers see the change as an update
+    c.executemany('''INSERT INTO revisions (topic_id, revision_no, due_date, done) VALUES (?, ?, ?, 0)
+                    ON CONFLICT(topic_id, revision_no) DO UPDATE SET
+                        due_date = excluded.due_date, done = 0, done_date = NULL''',
+                  [(topic_id, revision_no, to_day(revision_date)) for revision_no, revision_date in enumerate(revision_dates, 1)])
+    return upserted
+
+
+# Function to insert a new topic into the database
+@timed("insert_topic")
+def insert_topic(topic_name, entry_date, revision_dates):
+    def apply(conn):
+        _upsert_topic(conn.cursor(), topic_name, entry_date, revision_dates)
+    write(db_path(), apply)
+
+
+# Function to add many (topic name, entry date) pairs in one write, each scheduled from its entry date.
+# A topic that already exists is restarted from the new entry date; when a name is given twice the last
+# entry date wins. Returns the number of topics written.
+@timed("add_topics")
+def add_topics(topics, strategy):
+    topics = list(dict(topics).items())
+    if not topics:
+        return 0
+    schedules = initial_schedule(strategy, [entry_date for topic_name, entry_date in topics])
+
+    def apply(conn):
+        c = conn.cursor()
+        return sum(_upsert_topic(c, topic_name, entry_date, revision_dates)
+                   for (topic_name, entry_date), revision_dates in zip(topics, schedules))
+    return write(db_path(), apply)
+
+
+# Function to remove entry from the database by topic name
+@timed("remove_entry_by_topic")
+def remove_entry_by_topic(topic_name):
+    def apply(conn):
+        c = conn.cursor()
+        c.execute("DELETE FROM revisions WHERE topic_id IN (SELECT id FROM topics WHERE topic_name=?)", (topic_name,))
+        c.execute("DELETE FROM topics WHERE topic_name=?", (topic_name,))
+    write(db_path(), apply)
+
+
+# Function to turn the day numbers in pivoted topic rows back into dates
+def decode_topic_rows(rows):
+    return [(row[0],) + tuple(from_day(value) if i % 2 == 0 else value for i, value in enumerate(row[1:])) for row in rows]
+
+
+# Function to retrieve all topics from the database, one row per topic
+@versioned(db_path)
+@timed("retrieve_topics")
+def retrieve_topics():
+    with connection(db_path()) as conn:
+        c = conn.cursor()
+        c.execute(f'''SELECT t.topic_name, {REVISION_COLUMNS_SQL}
+                     FROM topics t JOIN revisions r ON r.topic_id = t.id
+                     GROUP BY t.id ORDER BY t.id''')
+        topics = decode_topic_rows(c.fetchall())
+    return topics
+
+
+# Function to draw the revision schedule of the whole library, cached until the next write or a change of options.
+# It lives here rather than in the app script, which Streamlit re-executes on every rerun, so the cache survives.
+@versioned(db_path)
+@timed("revision_schedule_chart")
+def revision_schedule_chart(aggregate_threshold=AGGREGATE_THRESHOLD, date_window=None):
+    topics = retrieve_topics()
+    return revision_chart([topic[0] for topic in topics], [topic[1::2] for topic in topics], aggregate_threshold, date_window)
+
+
+# Function to count all topics without fetching them
+@versioned(db_path)
+@timed("count_topics")
+def count_topics():
+    with connection(db_path()) as conn:
+        count = conn.execute("SELECT COUNT(*) FROM topics").fetchone()[0]
+    return count
+
+
+# Function to retrieve one page of topics; only the topics on the page are pivoted
+@versioned(db_path)
+@timed("retrieve_topics_page")
+def retrieve_topics_page(limit, offset, sort):
+    order = TOPIC_ORDER[sort]
+    with connection(db_path()) as conn:
+        c = conn.cursor()
+        c.execute(f'''SELECT t.topic_name, {REVISION_COLUMNS_SQL}
+                     FROM (SELECT id, topic_name FROM topics ORDER BY {order} LIMIT ? OFFSET ?) t
+                     JOIN revisions r ON r.topic_id = t.id
+                     GROUP BY t.id ORDER BY {order}''', (limit, offset))
+        topics = decode_topic_rows(c.fetchall())
+    return topics
+
+
+# Function to list up to limit topic names starting with prefix, in name order, served by the topic_name index
+@versioned(db_path)
+@timed("find_topic_names")
+def find_topic_names(prefix="", limit=PICKER_LIMIT):
+    with connection(db_path()) as conn:
+        names = [name for name, in conn.execute('''SELECT topic_name FROM topics
+                                                   WHERE topic_name >= ? AND topic_name < ?
+                                                   ORDER BY topic_name LIMIT ?''',
+                                                (prefix, prefix + "\U0010ffff", limit))]
+    return names
+
+
+# Function to retrieve one topic as a pivoted row, or None when there is no topic of that name
+@versioned(db_path)
+@timed("retrieve_topic")
+def retrieve_topic(topic_name):
+    with connection(db_path()) as conn:
+        c = conn.cursor()
+        c.execute(f'''SELECT t.topic_name, {REVISION_COLUMNS_SQL}
+                     FROM topics t JOIN revisions r ON r.topic_id = t.id
+                     WHERE t.topic_name = ? GROUP BY t.id''', (topic_name,))
+        topics = decode_topic_rows(c.fetchall())
+    return topics[0] if topics else None
+
+
+# Function to retrieve the revisions due on a date, served by the due_date index
+@versioned(db_path)
+@timed("retrieve_topics_due_on")
+def retrieve_topics_due_on(filter_date):
+    with connection(db_path()) as conn:
+        c = conn.cursor()
+        c.execute('''SELECT t.topic_name, 'Revision ' || r.revision_no
+                     FROM revisions r JOIN topics t ON t.id = r.topic_id
+                     WHERE r.due_date = ?
+                     ORDER BY t.id, r.revision_no''', (to_day(filter_date),))
+        topics = c.fetchall()
+    return topics
+
+
+# Function to retrieve every revision due on a date with its done flag, for the batch actions
+@versioned(db_path)
+@timed("retrieve_revisions_due_on")
+def retrieve_revisions_due_on(filter_date):
+    with connection(db_path()) as conn:
+        c = conn.cursor()
+        c.execute('''SELECT t.topic_name, r.revision_no, r.done
+                     FROM revisions r JOIN topics t ON t.id = r.topic_id
+                     WHERE r.due_date = ?
+                     ORDER BY t.id, r.revision_no''', (to_day(filter_date),))
+        revisions = c.fetchall()
+    return revisions
+
+
+# Function to update revision done, moving the topic's later revisions to follow the completion date
+@timed("update_revision_completion")
+def update_revision_completion(topic_done, revision_no, strategy):
+    complete_revisions(db_path(), strategy, [(topic_done, revision_no)])
+
+
+# Function to mark many (topic name, revision number) pairs done in one transaction.
+# Returns the number of revisions updated; pairs naming no existing revision are not counted.
+@timed("mark_revisions_done")
+def mark_revisions_done(items, strategy, done_date=None):
+    return complete_revisions(db_path(), strategy, items, done_date)
+
+
+# Function to read the revision totals of each day between two dates
+@versioned(db_path)
+@timed("retrieve_daily_load")
+def retrieve_daily_load(start, end):
+    with connection(db_path()) as conn:
+        load = conn.execute("SELECT due_date, total, done FROM daily_load WHERE due_date BETWEEN ? AND ? ORDER BY due_date",
+                            (to_day(start), to_day(end))).fetchall()
+    return [(from_day(due_date), total, done) for due_date, total, done in load]
+
+
+# Function to count revisions that are past due and not done
+@versioned(db_path)
+@timed("count_overdue")
+def count_overdue(today):
+    with connection(db_path()) as conn:
+        count = conn.execute("SELECT COALESCE(SUM(total - done), 0) FROM daily_load WHERE due_date < ?",
+                             (to_day(today),)).fetchone()[0]
+    return count
+
+
+# Function to list the oldest overdue revisions, served by the pending revisions index
+@versioned(db_path)
+@timed("retrieve_overdue")
+def retrieve_overdue(today, limit=OVERDUE_LIMIT):
+    with connection(db_path()) as conn:
+        c = conn.cursor()
+        c.execute('''SELECT t.topic_name, 'Revision ' || r.revision_no, r.due_date
+                     FROM revisions r JOIN topics t ON t.id = r.topic_id
+                     WHERE r.done = 0 AND r.due_date < ?
+                     ORDER BY r.due_date LIMIT ?''', (to_day(today), limit))
+        topics = [(topic_name, revision, from_day(due_date)) for topic_name, revision, due_date in c.fetchall()]
+    return topics
+
+
+# Function to simulate the daily load of every candidate pattern and new-topic rate, cached until the next write
+@versioned(db_path)
+@timed("forecast_workload")
+def forecast_workload(scheduler, patterns, rates, horizon):
+    scenarios = scenario_grid(patterns, rates, scheduler)
+    return scenarios, run_forecast(load_topic_state(db_path()), scenarios, horizon)
@@ -0,0 +1,203 @@
+import json
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from core.instrument import timed
+from core.revision_schema import to_day
+from core.writer import write
+
+DEFAULT_PATTERN = (7, 14, 30, 60, 90)
+REVISIONS = len(DEFAULT_PATTERN)
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+
+
+# Same gaps between revisions for every topic: the original 7/14/30/60/90 day schedule
+class FixedIntervalStrategy:
+    def __init__(self, pattern=DEFAULT_PATTERN):
+        self.pattern = np.asarray(pattern, dtype=np.int64)
+
+    # Days between consecutive revisions, one row per topic
+    def intervals(self, ease):
+        return np.broadcast_to(self.pattern, (len(ease), REVISIONS))
+
+    def update_ease(self, ease, days_late):
+        return ease
+
+
+# SM-2 style schedule: the first two gaps come from the pattern, every later gap is the previous one
+# times the topic's ease factor, and the ease factor moves with how late each revision was done
+class SM2Strategy:
+    def __init__(self, pattern=DEFAULT_PATTERN):
+        self.pattern = np.asarray(pattern, dtype=np.int64)
+
+    def intervals(self, ease):
+        ease = np.asarray(ease, dtype=float)
+        gaps = np.empty((len(ease), REVISIONS))
+        gaps[:, :2] = self.pattern[:2]
+        for k in range(2, REVISIONS):
+            gaps[:, k] = np.rint(gaps[:, k - 1] * ease)
+        return gaps.astype(np.int64)
+
+    def update_ease(self, ease, days_late):
+        # Quality 5 when done on time, losing a point per few days late, as in the SM-2 update
+        quality = 5 - np.clip(np.ceil(np.maximum(days_late, 0) / 3), 0, 3)
+        ease = np.asarray(ease, dtype=float) + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)
+        return np.maximum(ease, MIN_EASE)
+
+
+STRATEGIES = {"Fixed interval": FixedIntervalStrategy, "SM-2": SM2Strategy}
+
+
+# Function to read a pattern like "7, 14, 30, 60, 90" typed by the user
+def parse_pattern(text):
+    try:
+        pattern = tuple(int(part) for part in text.replace(" ", "").split(",") if part)
+    except ValueError:
+        raise ValueError("The revision pattern must be a comma separated list of days")
+    if len(pattern) != REVISIONS or min(pattern) <= 0:
+        raise ValueError(f"The revision pattern needs {REVISIONS} positive day counts")
+    return pattern
+
+
+# Function to build a strategy from a scheduler name and a pattern given as text or as a sequence of days
+def make_strategy(name="Fixed interval", pattern=DEFAULT_PATTERN):
+    if name not in STRATEGIES:
+        raise ValueError(f"Unknown scheduler {name!r}, expected one of: {', '.join(STRATEGIES)}")
+    if not isinstance(pattern, str):
+        pattern = ", ".join(map(str, pattern))
+    return STRATEGIES[name](parse_pattern(pattern))
+
+
+def _to_days(values):
+    return pd.to_datetime(pd.Series(values)).values.astype("datetime64[D]")
+
+
+# Stored dates are day numbers since 1970-01-01, which is exactly what datetime64[D] holds
+def _from_day_numbers(values):
+    return np.asarray(values, dtype=np.int64).astype("datetime64[D]")
+
+
+def _to_day_numbers(days):
+    return days.astype(np.int64).tolist()
+
+
+# Function to compute the revision dates of new topics: entry date plus the cumulative intervals
+def initial_schedule(strategy, entry_dates, ease=None):
+    ease = np.full(len(entry_dates), DEFAULT_EASE) if ease is None else np.asarray(ease)
+    offsets = np.cumsum(strategy.intervals(ease), axis=1).astype("timedelta64[D]")
+    return (_to_days(entry_dates)[:, None] + offsets).astype(object)
+
+
+def _load_revisions(conn, topic_names):
+    sql = '''SELECT r.topic_id, r.revision_no, r.due_date, r.done, r.done_date, t.entry_date, t.ease
+             FROM revisions r JOIN topics t ON t.id = r.topic_id'''
+    params = ()
+    if topic_names is not None:
+        sql += " WHERE t.topic_name IN (SELECT value FROM json_each(?))"
+        params = (json.dumps(list(topic_names)),)
+    return pd.read_sql_query(sql + " ORDER BY r.topic_id, r.revision_no", conn, params=params)
+
+
+# Anchor each topic of a _load_revisions frame on its last completed revision (or its entry date when
+# none is done). Returns the topic ids, each row's topic index, and per topic the anchor day,
+# the number of the last completed revision (0 for none) and the ease factor.
+def _anchor_topics(df):
+    topic_ids, topic_index = np.unique(df["topic_id"].values, return_inverse=True)
+    first = np.searchsorted(topic_index, np.arange(len(topic_ids)))
+    entry = _from_day_numbers(df["entry_date"].values[first])
+    ease = df["ease"].values[first]
+
+    due = _from_day_numbers(df["due_date"])
+    done = df["done"].values.astype(bool)
+    done_on = np.where(df["done_date"].notna(), _from_day_numbers(df["done_date"].fillna(df["due_date"])), due)
+    last_done = np.zeros(len(topic_ids), dtype=np.int64)
+    anchor = entry.copy()
+    done_rows = np.flatnonzero(done)
+    order = done_rows[np.argsort(df["revision_no"].values[done_rows], kind="stable")]
+    last_done[topic_index[order]] = df["revision_no"].values[order]
+    anchor[topic_index[order]] = done_on[order]
+    return topic_ids, topic_index, anchor, last_done, ease
+
+
+# Recompute every pending revision after the last completed one, relative to when that one was done
+def _reschedule(conn, strategy, topic_names, today, catch_up):
+    df = _load_revisions(conn, topic_names)
+    if df.empty:
+        return 0
+
+    topic_ids, topic_index, anchor, last_done, ease = _anchor_topics(df)
+    due = _from_day_numbers(df["due_date"])
+    done = df["done"].values.astype(bool)
+
+    cumulative = np.zeros((len(topic_ids), REVISIONS + 1), dtype=np.int64)
+    cumulative[:, 1:] = np.cumsum(strategy.intervals(ease), axis=1)
+
+    revision_no = df["revision_no"].values
+    pending = np.flatnonzero(~done & (revision_no > last_done[topic_index]))
+    t = topic_index[pending]
+    offsets = cumulative[t, revision_no[pending]] - cumulative[t, last_done[t]]
+    new_due = anchor[t] + offsets.astype("timedelta64[D]")
+
+    if catch_up:
+        # Slide each topic's remaining revisions so the earliest one is no longer in the past
+        earliest = np.full(len(topic_ids), np.datetime64("9999-12-31"), dtype="datetime64[D]")
+        np.minimum.at(earliest, t, new_due)
+        shift = np.maximum(np.datetime64(today, "D") - earliest, np.timedelta64(0, "D"))
+        new_due = new_due + shift[t]
+
+    changed = new_due != due[pending]
+    rows = list(zip(_to_day_numbers(new_due[changed]), topic_ids[t[changed]].tolist(), revision_no[pending][changed].tolist()))
+    conn.executemany("UPDATE revisions SET due_date = ? WHERE topic_id = ? AND revision_no = ?", rows)
+    return len(rows)
+
+
+# Function to reschedule the pending revisions of many topics (all when topic_names is None)
+# in one vectorized pass and one transaction. Returns the number of revisions that moved.
+# It runs as an exclusive request on the writer, since rescheduling a whole library can take a while.
+@timed("reschedule")
+def reschedule(db_path, strategy, topic_names=None, today=None, catch_up=False):
+    today = today or date.today()
+    return write(db_path, _reschedule, strategy, topic_names, today, catch_up, exclusive=True)
+
+
+# Function to mark (topic name, revision number) pairs done on done_date, update the ease factors
+# and move the rest of those topics' schedules, all in one write.
+# Revisions that are already done are left as they are; returns the number of revisions marked.
+@timed("complete_revisions")
+def complete_revisions(db_path, strategy, items, done_date=None):
+    done_date = done_date or date.today()
+    # A pair given twice is marked (and counted) once
+    items = list(dict.fromkeys(items))
+    if not items:
+        return 0
+    topic_names = sorted({topic_name for topic_name, revision_no in items})
+
+    def apply(conn):
+        marked = pd.read_sql_query('''SELECT t.id, r.revision_no, t.ease, r.due_date
+                                      FROM revisions r JOIN topics t ON t.id = r.topic_id
+                                      JOIN json_each(?) j ON t.topic_name = json_extract(j.value, '$[0]')
+                                                         AND r.revision_no = json_extract(j.value, '$[1]')
+                                      WHERE r.done = 0
+                                      ORDER BY t.id, r.revision_no''', conn, params=(json.dumps(items),))
+        # Revisions already done keep their completion date, so marking them again moves nothing
+        updated = conn.executemany('''UPDATE revisions SET done = 1, done_date = ?
+                                      WHERE done = 0 AND revision_no = ?
+                                        AND topic_id = (SELECT id FROM topics WHERE topic_name = ?)''',
+                                   [(to_day(done_date), revision_no, topic_name) for topic_name, revision_no in items]).rowcount
+
+        # Apply the ease updates in revision order when one topic has several completions
+        ease = marked.groupby("id")["ease"].first()
+        days_late = to_day(done_date) - marked["due_date"].values.astype(np.int64)
+        step = marked.groupby("id").cumcount().values
+        for n in range(step.max() + 1 if len(step) else 0):
+            rows = step == n
+            ids = marked["id"].values[rows]
+            ease[ids] = strategy.update_ease(ease[ids].values, days_late[rows])
+        conn.executemany("UPDATE topics SET ease = ? WHERE id = ?",
+                         list(zip(ease.astype(float).tolist(), ease.index.tolist())))
+        _reschedule(conn, strategy, topic_names, done_date, catch_up=False)
+        return updated
+    return write(db_path, apply)
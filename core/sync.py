@@ -0,0 +1,243 @@
+import json
+import os
+import re
+from collections import namedtuple
+from contextlib import contextmanager
+
+from core.db import connection
+from core.writer import write
+
+# Append-only change log for syncing two copies of a database.
+# Triggers record every insert, update (including reorders) and delete of the tracked tables with a
+# monotonic seq and a millisecond timestamp. Rows are identified by a natural key (JSON), never by
+# rowid, so the same topic matches on both sides. Conflicts are settled by last writer wins.
+
+# One tracked table. key and row are SQL expressions building JSON from the row alias {r};
+# upsert and delete are statements run with the named parameters of the row (or key) JSON.
+TrackedTable = namedtuple("TrackedTable", ["name", "key", "row", "upsert", "delete"])
+
+ChangeSet = namedtuple("ChangeSet", ["changes", "last_seq"])
+ApplyResult = namedtuple("ApplyResult", ["applied", "skipped"])
+SyncResult = namedtuple("SyncResult", ["sent", "received", "applied", "skipped"])
+
+# Copies a database can be synced with live in SYNC_DIR next to it, one directory per copy name, so the
+# sidebar never opens a path typed by the user (TENANT_DIR/<user>/sync/<name>/<file name> with tenants)
+SYNC_DIR = "sync"
+COPY_NAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]{0,63}")
+
+# Log entries written since the last compaction that make compact_if_needed() compact the log
+COMPACT_THRESHOLD = 100000
+
+# Writes logged by the triggers of each tracked table, named {table}_log_{event}
+LOG_EVENTS = ["insert", "update", "delete"]
+
+NOW_MS = "CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)"
+
+CHANGE_LOG_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS change_log
+         (seq INTEGER PRIMARY KEY AUTOINCREMENT,
+         table_name TEXT NOT NULL,
+         row_key TEXT NOT NULL,
+         op TEXT NOT NULL,
+         row_data TEXT,
+         changed_at INTEGER NOT NULL,
+         source TEXT)''',
+    "CREATE INDEX IF NOT EXISTS idx_change_log_key ON change_log (table_name, row_key, changed_at)",
+    '''CREATE TABLE IF NOT EXISTS sync_peers
+         (peer TEXT PRIMARY KEY,
+         pulled_seq INTEGER NOT NULL DEFAULT 0,
+         pushed_seq INTEGER NOT NULL DEFAULT 0)''',
+    # Highest seq when the log was last compacted
+    '''CREATE TABLE IF NOT EXISTS change_log_state
+         (id INTEGER PRIMARY KEY CHECK (id = 1),
+         compacted_seq INTEGER NOT NULL)''',
+]
+
+
+def _log(table, key, op, row):
+    return (f"INSERT INTO change_log (table_name, row_key, op, row_data, changed_at) "
+            f"VALUES ('{table.name}', {key}, '{op}', {row}, {NOW_MS})")
+
+
+# Function to list the statements creating the change log and the triggers of the tracked tables
+def change_log_schema(tables):
+    statements = list(CHANGE_LOG_SCHEMA)
+    for table in tables:
+        old_key, new_key = table.key.format(r="old"), table.key.format(r="new")
+        new_row = table.row.format(r="new")
+        statements += [
+            f'''CREATE TRIGGER IF NOT EXISTS {table.name}_log_insert AFTER INSERT ON {table.name} BEGIN
+                  {_log(table, new_key, 'upsert', new_row)};
+                END''',
+            # A change of key (a rename) is logged as a delete of the old key and an upsert of the new one
+            f'''CREATE TRIGGER IF NOT EXISTS {table.name}_log_update AFTER UPDATE ON {table.name} BEGIN
+                  INSERT INTO change_log (table_name, row_key, op, row_data, changed_at)
+                  SELECT '{table.name}', {old_key}, 'delete', NULL, {NOW_MS} WHERE {old_key} IS NOT {new_key};
+                  {_log(table, new_key, 'upsert', new_row)};
+                END''',
+            f'''CREATE TRIGGER IF NOT EXISTS {table.name}_log_delete AFTER DELETE ON {table.name} BEGIN
+                  {_log(table, old_key, 'delete', 'NULL')};
+                END''',
+        ]
+    return statements
+
+
+# Function to log the rows of table matching where (a condition over the row alias t) in one statement:
+# their current contents for op 'upsert', their keys only for op 'delete' (run it before deleting them)
+def log_rows(conn, table, op, where="1", params=()):
+    row = table.row.format(r="t") if op == "upsert" else "NULL"
+    conn.execute(f'''INSERT INTO change_log (table_name, row_key, op, row_data, changed_at)
+                     SELECT '{table.name}', {table.key.format(r="t")}, '{op}', {row}, {NOW_MS}
+                     FROM {table.name} t WHERE {where}''', params)
+
+
+# Function to log the current rows of the tracked tables, so a database that had no change log
+# can be pulled from in full by a new peer
+def backfill_change_log(conn, tables):
+    for table in tables:
+        log_rows(conn, table, "upsert")
+
+
+# Run a bulk write on conn with the change log triggers of tables suspended, so rows are not logged one
+# trigger call at a time; the caller logs what it changed with log_rows() instead. The triggers are dropped
+# inside the caller's transaction, so an error rolls their removal back together with the write.
+@contextmanager
+def log_suspended(conn, tables):
+    for table in tables:
+        for event in LOG_EVENTS:
+            conn.execute(f"DROP TRIGGER IF EXISTS {table.name}_log_{event}")
+    yield
+    for sql in change_log_schema(tables):
+        conn.execute(sql)
+
+
+def _changes_since(conn, since, exclude_source):
+    changes = conn.execute('''SELECT seq, table_name, row_key, op, row_data, changed_at FROM change_log
+                              WHERE seq > ? AND (source IS NULL OR source != ?) ORDER BY seq''',
+                           (since, exclude_source)).fetchall()
+    return ChangeSet(changes, changes[-1][0] if changes else since)
+
+
+# Function to read the changes after seq since, in order, leaving out changes that came from exclude_source
+def changes_since(db_path, since=0, exclude_source=None):
+    with connection(db_path) as conn:
+        return _changes_since(conn, since, exclude_source)
+
+
+def _apply_changes(conn, changes, tables, source):
+    by_name = {table.name: table for table in tables}
+    applied = skipped = 0
+    for seq, table_name, row_key, op, row_data, changed_at in changes:
+        # Only changes that did not come from source count, so its changes of one row in the same millisecond all apply
+        latest = conn.execute('''SELECT MAX(changed_at) FROM change_log WHERE table_name = ? AND row_key = ?
+                                 AND (source IS NULL OR source != ?)''', (table_name, row_key, source)).fetchone()[0]
+        if latest is not None and latest >= changed_at:
+            skipped += 1
+            continue
+        before = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+        table = by_name[table_name]
+        if op == "delete":
+            conn.execute(table.delete, json.loads(row_key))
+        elif conn.execute(table.upsert, json.loads(row_data)).rowcount == 0:
+            # An upsert that wrote nothing, such as a revision of a topic deleted here
+            skipped += 1
+            continue
+        conn.execute("UPDATE change_log SET changed_at = ?, source = ? WHERE seq > ?", (changed_at, source, before))
+        applied += 1
+    return ApplyResult(applied, skipped)
+
+
+# Function to apply changes read from another database, in seq order and in one exclusive write.
+# A change is skipped when this database changed the same row at the same time or later (last writer wins),
+# and an upsert is skipped when it writes nothing (the tracked table's upsert decides, e.g. a missing parent row).
+# The log rows written while applying keep the original timestamp and are tagged with source.
+def apply_changes(db_path, changes, tables, source=None):
+    return write(db_path, _apply_changes, changes, tables, source, exclusive=True)
+
+
+# Function to sync db_path with another copy in both directions, sending and receiving only the changes
+# made since the last sync with that peer. setup(conn), if given, creates or upgrades the peer's schema first.
+# Both sides are written while holding both write locks, and the progress is recorded in the same local
+# transaction: a failed sync changes neither side. The peer commits first, so if the local commit then
+# fails the next sync sends the same changes again and the peer skips them as already applied.
+def sync(db_path, peer_path, tables, setup=None):
+    local_id, peer_id = os.path.abspath(db_path), os.path.abspath(peer_path)
+    if setup is not None:
+        with connection(peer_path) as conn:
+            setup(conn)
+            conn.commit()
+
+    def apply(conn):
+        with connection(peer_path) as peer:
+            peer.execute("BEGIN IMMEDIATE")
+            progress = conn.execute("SELECT pulled_seq, pushed_seq FROM sync_peers WHERE peer = ?", (peer_id,)).fetchone()
+            pulled, pushed = progress or (0, 0)
+
+            outgoing = _changes_since(conn, pushed, peer_id)
+            incoming = _changes_since(peer, pulled, local_id)
+            sent = _apply_changes(peer, outgoing.changes, tables, local_id)
+            received = _apply_changes(conn, incoming.changes, tables, peer_id)
+            conn.execute('''INSERT INTO sync_peers (peer, pulled_seq, pushed_seq) VALUES (?, ?, ?)
+                            ON CONFLICT(peer) DO UPDATE SET pulled_seq = excluded.pulled_seq,
+                                                            pushed_seq = excluded.pushed_seq''',
+                         (peer_id, incoming.last_seq, outgoing.last_seq))
+            # Both logs are compacted while the locks are held, so every successful sync keeps them small
+            _compact(peer)
+            _compact(conn)
+            peer.commit()
+        return SyncResult(len(outgoing.changes), len(incoming.changes),
+                          sent.applied + received.applied, sent.skipped + received.skipped)
+    return write(db_path, apply, exclusive=True)
+
+
+def _compact(conn):
+    conn.execute('''DELETE FROM change_log WHERE seq NOT IN
+                      (SELECT MAX(seq) FROM change_log GROUP BY table_name, row_key)''')
+    removed = conn.execute("SELECT changes()").fetchone()[0]
+    conn.execute('''INSERT INTO change_log_state (id, compacted_seq)
+                    SELECT 1, COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'change_log'
+                    ON CONFLICT(id) DO UPDATE SET compacted_seq = excluded.compacted_seq''')
+    return removed
+
+
+# Function to drop log entries superseded by a later change of the same row.
+# The latest change of every row is kept, so a peer pulling from any seq still ends up in the same state.
+def compact_change_log(db_path):
+    return write(db_path, _compact, exclusive=True)
+
+
+# Function to compact the log once more than threshold entries were written since it was last compacted.
+# The check reads two single rows, so it is cheap enough to run on every page load.
+def compact_if_needed(db_path, threshold=COMPACT_THRESHOLD):
+    with connection(db_path) as conn:
+        written = conn.execute('''SELECT COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'change_log'), 0)
+                                       - COALESCE((SELECT compacted_seq FROM change_log_state), 0)''').fetchone()[0]
+    return compact_change_log(db_path) if written > threshold else 0
+
+
+# Function to get the file of the copy of db_path called name, inside the sync directory next to db_path
+def copy_path(db_path, name):
+    if not COPY_NAME.fullmatch(name):
+        raise ValueError(f"Invalid copy name {name!r}: use up to 64 letters, digits and _ . -")
+    directory = os.path.join(os.path.dirname(db_path), SYNC_DIR, name)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, os.path.basename(db_path))
+
+
+# Function to show the sync controls in the sidebar, compacting the change log first when it has grown
+def sync_sidebar(db_path, tables, setup=None):
+    import streamlit as st
+    compact_if_needed(db_path)
+    st.sidebar.markdown("***")
+    st.sidebar.title("Sync")
+    name = st.sidebar.text_input("Copy to sync with", key="sync_peer",
+                                 help=f"Syncs with {os.path.join(os.path.dirname(db_path), SYNC_DIR, '<copy>', os.path.basename(db_path))}")
+    if st.sidebar.button("Sync now") and name.strip():
+        try:
+            peer_path = copy_path(db_path, name.strip())
+        except ValueError as e:
+            st.sidebar.error(str(e))
+            return
+        result = sync(db_path, peer_path, tables, setup)
+        st.sidebar.success(f"Sent {result.sent} and received {result.received} changes "
+                           f"({result.applied} applied, {result.skipped} already up to date).")
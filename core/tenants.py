@@ -0,0 +1,74 @@
+import contextvars
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+# One SQLite file per user. The apps resolve their database through tenant_path(), which maps the shared
+# file name to TENANT_DIR/<user>/<file name> for the user of the current session, so users never share
+# a table, a UNIQUE constraint or a write lock. Without a user (no ?user= in the URL, scripts, benchmarks)
+# the shared file is used as before. Open pools and writers are bounded by core.db.MAX_OPEN_DATABASES.
+# The ?user= parameter is NOT authenticated: anyone who can reach the app can open any user's data by
+# changing the URL. It separates workloads, not people; put the apps behind an authenticating proxy
+# that sets the parameter before trusting it to keep users' data apart.
+TENANT_DIR = os.environ.get("APP_TENANT_DIR", "tenants")
+QUERY_PARAM = "user"
+USER_ID = re.compile(r"[a-z0-9][a-z0-9_.@-]{0,63}")
+
+# A context variable rather than a thread-local, so it follows both Streamlit's script threads and asyncio tasks
+_user = contextvars.ContextVar("tenant_user", default=None)
+_prepared = set()
+_prepared_lock = threading.Lock()
+
+
+# Function to get the user the current session or request is routed to, None for the shared database
+def current_user():
+    return _user.get()
+
+
+# Function to reject user ids that are not safe as a directory name
+def check_user(user):
+    if user is not None and not USER_ID.fullmatch(user):
+        raise ValueError(f"Invalid user id {user!r}: use up to 64 lowercase letters, digits and _ . @ -")
+    return user
+
+
+# Route the database calls made inside the block to the files of user (None for the shared files)
+@contextmanager
+def tenant(user):
+    token = _user.set(check_user(user))
+    try:
+        yield
+    finally:
+        _user.reset(token)
+
+
+# Function to map a database file to the current user's copy of it.
+# setup(path), if given, runs once per process for every file before it is first handed out.
+def tenant_path(db_path, setup=None):
+    user = _user.get()
+    path = db_path if user is None else os.path.join(TENANT_DIR, user, os.path.basename(db_path))
+    if setup is not None and path not in _prepared:
+        with _prepared_lock:
+            if path not in _prepared:
+                if user is not None:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                setup(path)
+                _prepared.add(path)
+    return path
+
+
+# Route one Streamlit script run to the user named by the (unauthenticated) ?user= query parameter
+@contextmanager
+def session_tenant():
+    import streamlit as st
+    user = st.query_params.get(QUERY_PARAM, "").strip().lower() or None
+    try:
+        check_user(user)
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
+    if user is not None:
+        st.sidebar.caption(f"Using the data of user {user} (from the URL, not a login)")
+    with tenant(user):
+        yield
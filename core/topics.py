@@ -0,0 +1,474 @@
+import re
+from contextlib import contextmanager
+
+from core.cache import versioned
+from core.charts import category_pie
+from core.db import MAX_OPEN_DATABASES, connection, transaction
+from core.export import export_query
+from core.instrument import timed
+from core.ordering import position_between, rebalance_category
+from core.sync import TrackedTable, backfill_change_log, change_log_schema, log_rows, log_suspended
+from core.tenants import tenant_path
+from core.writer import write
+
+# Queries and writes on topic.db, shared by the Topic Assistant app, the HTTP API and the CLI.
+# Every function works on the database of the current user (see core.tenants).
+
+DB_PATH = "topic.db"
+SEARCH_LIMIT = 50
+
+TOPIC_COLUMNS = ["Position","Topic Name", "Category", "Resource"]
+
+# Sort choices for the topic tables, mapped to ORDER BY clauses over topics t
+DEFAULT_ORDER = "Category and position"
+TOPIC_ORDER = {DEFAULT_ORDER: "t.category, t.position, t.id",
+               "Topic name": "t.topic_name", "Topic name (Z-A)": "t.topic_name DESC"}
+
+# Whole library in download order, with the same columns and positions as the CSV import expects
+EXPORT_SQL = '''SELECT ROW_NUMBER() OVER (PARTITION BY category ORDER BY position, id) - 1,
+                       topic_name, category, resource
+                FROM topics ORDER BY category, position, id'''
+
+# Topic rows tracked by the change log for syncing, matched between databases by topic name
+SYNC_TABLES = [TrackedTable(
+    "topics",
+    key="json_object('topic_name', {r}.topic_name)",
+    row="json_object('position', {r}.position, 'topic_name', {r}.topic_name, 'category', {r}.category, 'resource', {r}.resource)",
+    upsert='''INSERT INTO topics (position, topic_name, category, resource) VALUES (:position, :topic_name, :category, :resource)
+              ON CONFLICT(topic_name) DO UPDATE SET
+                  position = excluded.position, category = excluded.category, resource = excluded.resource''',
+    delete="DELETE FROM topics WHERE topic_name = :topic_name")]
+
+# Triggers keeping topics_fts in step with topics, by name so bulk writes can suspend them
+FTS_TRIGGERS = {
+    "topics_fts_insert": '''CREATE TRIGGER IF NOT EXISTS topics_fts_insert AFTER INSERT ON topics BEGIN
+                INSERT INTO topics_fts (rowid, topic_name, category, resource)
+                VALUES (new.id, new.topic_name, new.category, new.resource);
+              END''',
+    "topics_fts_delete": '''CREATE TRIGGER IF NOT EXISTS topics_fts_delete AFTER DELETE ON topics BEGIN
+                INSERT INTO topics_fts (topics_fts, rowid, topic_name, category, resource)
+                VALUES ('delete', old.id, old.topic_name, old.category, old.resource);
+              END''',
+    "topics_fts_update": '''CREATE TRIGGER IF NOT EXISTS topics_fts_update AFTER UPDATE OF topic_name, category, resource ON topics BEGIN
+                INSERT INTO topics_fts (topics_fts, rowid, topic_name, category, resource)
+                VALUES ('delete', old.id, old.topic_name, old.category, old.resource);
+                INSERT INTO topics_fts (rowid, topic_name, category, resource)
+                VALUES (new.id, new.topic_name, new.category, new.resource);
+              END''',
+}
+
+
+# Triggers keeping category_stats in step with topics, by name so bulk writes can suspend them
+CATEGORY_STATS_TRIGGERS = {
+    "category_stats_insert": '''CREATE TRIGGER IF NOT EXISTS category_stats_insert AFTER INSERT ON topics BEGIN
+                INSERT INTO category_stats (category, count, max_position) VALUES (new.category, 1, new.position)
+                ON CONFLICT(category) DO UPDATE SET count = count + 1,
+                  max_position = CASE WHEN max_position IS NULL OR new.position > max_position
+                                      THEN new.position ELSE max_position END;
+              END''',
+    "category_stats_delete": '''CREATE TRIGGER IF NOT EXISTS category_stats_delete AFTER DELETE ON topics BEGIN
+                UPDATE category_stats SET count = count - 1,
+                  max_position = (SELECT MAX(position) FROM topics WHERE category = old.category)
+                WHERE category = old.category;
+                DELETE FROM category_stats WHERE category = old.category AND count = 0;
+              END''',
+    "category_stats_update": '''CREATE TRIGGER IF NOT EXISTS category_stats_update AFTER UPDATE OF category, position ON topics BEGIN
+                UPDATE category_stats SET count = count - 1,
+                  max_position = (SELECT MAX(position) FROM topics WHERE category = old.category)
+                WHERE category = old.category;
+                DELETE FROM category_stats WHERE category = old.category AND count = 0;
+                INSERT INTO category_stats (category, count, max_position) VALUES (new.category, 1, new.position)
+                ON CONFLICT(category) DO UPDATE SET count = count + 1,
+                  max_position = (SELECT MAX(position) FROM topics WHERE category = new.category);
+              END''',
+}
+
+# Statement filling category_stats from topics in one pass
+CATEGORY_STATS_SQL = '''INSERT INTO category_stats (category, count, max_position)
+                        SELECT category, COUNT(*), MAX(position) FROM topics GROUP BY category'''
+
+# topics has an INTEGER PRIMARY KEY so the ids used by topics_fts and the rankings survive a VACUUM,
+# which may renumber the implicit rowids of a table without one
+TOPICS_TABLE = '''CREATE TABLE IF NOT EXISTS {name}
+              (id INTEGER PRIMARY KEY,
+              position INTEGER, 
+              topic_name TEXT UNIQUE NOT NULL,
+              category TEXT NOT NULL, 
+              resource TEXT NOT NULL)'''
+
+
+# Function to give a topics table from before ids were added an id column, keeping each row's rowid as its id.
+# The old table's triggers and indexes go with it and the full-text index is dropped to be rebuilt on the ids;
+# create_schema recreates them all. The copy runs before any trigger exists, so nothing is logged for syncing.
+def _add_topic_ids(c):
+    columns = [col[1] for col in c.execute("PRAGMA table_info(topics)")]
+    if not columns or "id" in columns:
+        return
+    c.execute(TOPICS_TABLE.format(name="topics_with_ids"))
+    c.execute('''INSERT INTO topics_with_ids (id, position, topic_name, category, resource)
+                 SELECT rowid, position, topic_name, category, resource FROM topics''')
+    c.execute("DROP TABLE topics")
+    c.execute("DROP TABLE IF EXISTS topics_fts")
+    c.execute("ALTER TABLE topics_with_ids RENAME TO topics")
+
+
+# Function to create the topic.db tables, indexes and triggers if they do not exist
+def create_schema(conn):
+    c = conn.cursor()
+    _add_topic_ids(c)
+    c.execute(TOPICS_TABLE.format(name="topics"))
+    c.execute("CREATE INDEX IF NOT EXISTS idx_topics_category_position ON topics (category, position)")
+
+    # Full-text index over name, category and resource, kept in sync with topics by triggers
+    fts_exists = c.execute("SELECT 1 FROM sqlite_master WHERE name = 'topics_fts'").fetchone()
+    c.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS topics_fts USING fts5
+              (topic_name, category, resource, content='topics', content_rowid='id', prefix='2 3')''')
+    for sql in FTS_TRIGGERS.values():
+        c.execute(sql)
+    if not fts_exists:
+        c.execute("INSERT INTO topics_fts (topics_fts) VALUES ('rebuild')")
+
+    # Per-category topic count and highest position, kept in sync with topics by triggers
+    stats_exists = c.execute("SELECT 1 FROM sqlite_master WHERE name = 'category_stats'").fetchone()
+    c.execute('''CREATE TABLE IF NOT EXISTS category_stats
+              (category TEXT PRIMARY KEY,
+              count INTEGER NOT NULL,
+              max_position INTEGER)''')
+    for sql in CATEGORY_STATS_TRIGGERS.values():
+        c.execute(sql)
+    if not stats_exists:
+        c.execute(CATEGORY_STATS_SQL)
+
+    # Change log for syncing with other copies of topic.db
+    log_exists = c.execute("SELECT 1 FROM sqlite_master WHERE name = 'change_log'").fetchone()
+    for sql in change_log_schema(SYNC_TABLES):
+        c.execute(sql)
+    if not log_exists:
+        backfill_change_log(conn, SYNC_TABLES)
+
+
+# Run a bulk write on conn with the full-text triggers suspended, then bring topics_fts up to date once:
+# by indexing the rows added during the block, or with rebuild=True (for updates and deletes too) by
+# rebuilding the whole index. The triggers are dropped inside the caller's transaction, so an error
+# rolls their removal back together with the write.
+@contextmanager
+def fts_suspended(conn, rebuild=False):
+    last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM topics").fetchone()[0]
+    for name in FTS_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    yield
+    if rebuild:
+        conn.execute("INSERT INTO topics_fts (topics_fts) VALUES ('rebuild')")
+    else:
+        conn.execute('''INSERT INTO topics_fts (rowid, topic_name, category, resource)
+                        SELECT id, topic_name, category, resource FROM topics WHERE id > ?''', (last_id,))
+    for sql in FTS_TRIGGERS.values():
+        conn.execute(sql)
+
+
+# Run a bulk write on conn with the category_stats triggers suspended, then bring the counts up to date
+# with one GROUP BY: over the rows added during the block, or with recount=True (for updates and deletes
+# too) over the whole table. Like fts_suspended, it relies on the caller's transaction.
+@contextmanager
+def stats_suspended(conn, recount=False):
+    last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM topics").fetchone()[0]
+    for name in CATEGORY_STATS_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    yield
+    if recount:
+        conn.execute("DELETE FROM category_stats")
+        conn.execute(CATEGORY_STATS_SQL)
+    else:
+        conn.execute('''INSERT INTO category_stats (category, count, max_position)
+                        SELECT category, COUNT(*), MAX(position) FROM topics WHERE id > ? GROUP BY category
+                        ON CONFLICT(category) DO UPDATE SET count = count + excluded.count,
+                          max_position = CASE WHEN max_position IS NULL OR excluded.max_position > max_position
+                                              THEN excluded.max_position ELSE max_position END''',
+                     (last_id,))
+    for sql in CATEGORY_STATS_TRIGGERS.values():
+        conn.execute(sql)
+
+
+# Function to create SQLite database table if not exists
+def create_table(path):
+    with transaction(path) as conn:
+        create_schema(conn)
+
+
+# Function to get the database file of the current user, created or upgraded on first use
+def db_path():
+    return tenant_path(DB_PATH, setup=create_table)
+
+
+# Function to get the position for a new topic at the end of a category
+@timed("get_max_position")
+def get_max_position(category):
+    with connection(db_path()) as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT max_position FROM category_stats WHERE category = ?", (category,))
+        row = cursor.fetchone()
+        max_position = row[0] if row else None
+
+    return position_between(max_position, None)
+
+
+# Function to insert a new topic into the database; raises sqlite3.IntegrityError if the name is taken
+@timed("insert_topic")
+def insert_topic(max_pos,topic_name,category,resource):
+    def apply(conn):
+        c = conn.cursor()
+        c.execute('''INSERT INTO topics (position,topic_name, category,resource) 
+                        VALUES (? , ?, ?, ?)''', 
+                    (max_pos,topic_name,category,resource))
+    write(db_path(), apply)
+
+
+# Function to add many (topic name, category, resource) rows in one write, each at the end of its category.
+# Returns the names that were skipped because a topic of that name already exists.
+@timed("add_topics")
+def add_topics(rows):
+    def apply(conn):
+        c = conn.cursor()
+        skipped = []
+        for topic_name, category, resource in rows:
+            row = c.execute("SELECT max_position FROM category_stats WHERE category = ?", (category,)).fetchone()
+            c.execute("INSERT OR IGNORE INTO topics (position, topic_name, category, resource) VALUES (?, ?, ?, ?)",
+                      (position_between(row[0] if row else None, None), topic_name, category, resource))
+            if not c.rowcount:
+                skipped.append(topic_name)
+        return skipped
+    return write(db_path(), apply)
+
+
+# Function to remove entry from the database by topic name; positions are sparse so no other row changes
+@timed("remove_entry_by_topic")
+def remove_entry_by_topic(topic_name):
+    def apply(conn):
+        c = conn.cursor()
+        c.execute("DELETE FROM topics WHERE topic_name=?", (topic_name,))
+    write(db_path(), apply)
+
+
+# Function to retrieve all topics from the database, with each position shown as the 0-based rank in its category
+@versioned(db_path)
+@timed("retrieve_topics")
+def retrieve_topics():
+    with connection(db_path()) as conn:
+        c = conn.cursor()
+        c.execute('''SELECT ROW_NUMBER() OVER (PARTITION BY category ORDER BY position, id) - 1,
+                        topic_name, category, resource
+                     FROM topics''')
+        topics = c.fetchall()
+    return topics
+
+
+# Function to count topics, optionally in one category, without fetching them
+@versioned(db_path)
+@timed("count_topics")
+def count_topics(category=None):
+    with connection(db_path()) as conn:
+        if category is None:
+            count = conn.execute("SELECT COALESCE(SUM(count), 0) FROM category_stats").fetchone()[0]
+        else:
+            count = conn.execute("SELECT COALESCE(SUM(count), 0) FROM category_stats WHERE category = ?",
+                                 (category,)).fetchone()[0]
+    return count
+
+
+# Function to get the 0-based rank within its category of each (id, category, position) row.
+# Each category's rows are visited in position order and every count covers only the (category, position)
+# index range since the previous row, so ranking a page reads each index entry in front of it at most once.
+def category_ranks(conn, rows):
+    def count(where, *params):
+        return conn.execute(f"SELECT COUNT(*) FROM topics WHERE category = ? AND {where}", params).fetchone()[0]
+
+    by_category = {}
+    for topic_id, category, position in rows:
+        by_category.setdefault(category, []).append((position, topic_id))
+
+    ranks = {}
+    for category, members in by_category.items():
+        # NULL positions sort first, as they do in ORDER BY position
+        members.sort(key=lambda member: (member[0] is not None, member[0] or 0, member[1]))
+        below = previous = None
+        for position, topic_id in members:
+            if position is None:
+                ranks[topic_id] = count("position IS NULL AND id < ?", category, topic_id)
+                continue
+            if previous is None:
+                below = count("position IS NULL", category) + count("position < ?", category, position)
+            elif position != previous:
+                below += count("position >= ? AND position < ?", category, previous, position)
+            previous = position
+            # Ties on position are ordered by id
+            ranks[topic_id] = below + count("position = ? AND id < ?", category, position, topic_id)
+    return [ranks[topic_id] for topic_id, category, position in rows]
+
+
+# Function to replace the leading (id, position) columns of topic rows with each topic's rank in its category
+def with_ranks(conn, rows):
+    ranks = category_ranks(conn, [(topic_id, category, position) for topic_id, position, topic_name, category, resource in rows])
+    return [(rank,) + row[2:] for rank, row in zip(ranks, rows)]
+
+
+# Function to retrieve one page of topics, optionally in one category, sorted in SQL
+@versioned(db_path)
+@timed("retrieve_topics_page")
+def retrieve_topics_page(category, limit, offset, sort):
+    order = TOPIC_ORDER[sort]
+    where, params = ("WHERE t.category = ?", (category,)) if category is not None else ("", ())
+    with connection(db_path()) as conn:
+        c = conn.cursor()
+        c.execute(f'''SELECT t.id, t.position, t.topic_name, t.category, t.resource
+                     FROM topics t {where} ORDER BY {order} LIMIT ? OFFSET ?''', params + (limit, offset))
+        rows = c.fetchall()
+        if not rows:
+            return []
+        if sort != DEFAULT_ORDER:
+            return with_ranks(conn, rows)
+
+        # In category order the ranks on a page are consecutive, so only the first one is counted
+        rank = with_ranks(conn, rows[:1])[0][0]
+
+    topics = []
+    for i, (topic_id, position, topic_name, topic_category, resource) in enumerate(rows):
+        if i > 0 and topic_category != rows[i - 1][3]:
+            rank = 0
+        topics.append((rank, topic_name, topic_category, resource))
+        rank += 1
+    return topics
+
+
+# Function to turn free text into an FTS5 query that matches every word as a prefix
+def fts_query(text):
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", text))
+
+
+# Function to search topic names, categories and resources, best matches first
+@versioned(db_path)
+@timed("search_topics")
+def search_topics(text, limit=SEARCH_LIMIT):
+    query = fts_query(text)
+    if not query:
+        return []
+    with connection(db_path()) as conn:
+        c = conn.cursor()
+        c.execute('''SELECT t.id, t.position, t.topic_name, t.category, t.resource
+                     FROM topics_fts f JOIN topics t ON t.id = f.rowid
+                     WHERE topics_fts MATCH ?
+                     ORDER BY bm25(topics_fts, 10.0, 1.0, 2.0)
+                     LIMIT ?''', (query, limit))
+        topics = with_ranks(conn, c.fetchall())
+    return topics
+
+
+# Function to move a topic directly after another topic of its category, or to the top when after_topic is None.
+# This is the drag-to-reorder entry point: only the moved row is rewritten unless its neighbours have no gap left.
+@timed("move_topic")
+def move_topic(topic_name, after_topic=None):
+    def apply(conn):
+        _move_after(conn.cursor(), topic_name, after_topic)
+    write(db_path(), apply)
+
+
+def _move_after(cursor, topic_name, after_topic):
+    row = cursor.execute("SELECT category FROM topics WHERE topic_name = ?", (topic_name,)).fetchone()
+    if row is None:
+        return
+    category = row[0]
+
+    for attempt in range(2):
+        if after_topic is None:
+            low = None
+            high = cursor.execute("SELECT MIN(position) FROM topics WHERE category = ? AND topic_name != ?",
+                                  (category, topic_name)).fetchone()[0]
+        else:
+            after = cursor.execute("SELECT position FROM topics WHERE topic_name = ? AND category = ?",
+                                   (after_topic, category)).fetchone()
+            if after is None:
+                return
+            low = after[0]
+            high = cursor.execute('''SELECT MIN(position) FROM topics
+                                     WHERE category = ? AND position > ? AND topic_name != ?''',
+                                  (category, low, topic_name)).fetchone()[0]
+        new_position = position_between(low, high)
+        if new_position is not None:
+            break
+        # Neighbours are adjacent: spread the category out once and try again
+        rebalance_category(cursor, category)
+
+    cursor.execute("UPDATE topics SET position = ? WHERE topic_name = ?", (new_position, topic_name))
+
+
+# Function to move a topic to a 0-based position within its category
+@timed("reorder_topic")
+def reorder_topic(topic_name, new_pos):
+    def apply(conn):
+        cursor = conn.cursor()
+
+        row = cursor.execute("SELECT category FROM topics WHERE topic_name = ?", (topic_name,)).fetchone()
+        if row is None:
+            return
+
+        # Find the topic that should end up directly before the moved one
+        after_topic = None
+        if new_pos > 0:
+            after = cursor.execute('''SELECT topic_name FROM topics WHERE category = ? AND topic_name != ?
+                                      ORDER BY position, id LIMIT 1 OFFSET ?''',
+                                   (row[0], topic_name, new_pos - 1)).fetchone()
+            if after is None:
+                after = cursor.execute('''SELECT topic_name FROM topics WHERE category = ? AND topic_name != ?
+                                          ORDER BY position DESC, id DESC LIMIT 1''',
+                                       (row[0], topic_name)).fetchone()
+            after_topic = after[0] if after else None
+        _move_after(cursor, topic_name, after_topic)
+    write(db_path(), apply)
+
+
+# Function to insert rows into the database, skipping rows that break a constraint.
+# The new rows are added to the full-text index, counted in category_stats and logged for syncing
+# in one statement each, instead of one trigger call per row.
+@timed("insert_rows")
+def insert_rows(rows):
+    def apply(conn):
+        c = conn.cursor()
+        last_id = c.execute("SELECT COALESCE(MAX(id), 0) FROM topics").fetchone()[0]
+        with fts_suspended(conn), stats_suspended(conn), log_suspended(conn, SYNC_TABLES):
+            c.executemany('''INSERT OR IGNORE INTO topics (position,topic_name, category,resource) 
+                        VALUES (? , ?, ?, ?)''', rows)
+            log_rows(conn, SYNC_TABLES[0], "upsert", "t.id > ?", (last_id,))
+    write(db_path(), apply)
+
+
+@timed("delete_rows")
+def delete_rows():
+    def apply(conn):
+        c = conn.cursor()
+        with fts_suspended(conn, rebuild=True), stats_suspended(conn, recount=True), log_suspended(conn, SYNC_TABLES):
+            log_rows(conn, SYNC_TABLES[0], "delete")
+            c.execute("DELETE FROM topics")
+    write(db_path(), apply)
+
+
+# Cached (category, count) pairs
+@versioned(db_path)
+@timed("category_counts")
+def category_counts():
+    with connection(db_path()) as conn:
+        counts = conn.execute("SELECT category, count FROM category_stats ORDER BY category").fetchall()
+    return counts
+
+
+# Cached pie chart of the category counts. It lives here rather than in the app script, which Streamlit
+# re-executes on every rerun, so the cache survives between runs.
+@versioned(db_path)
+@timed("category_chart")
+def category_chart():
+    return category_pie(category_counts())
+
+
+# Cached export of the whole library, kept until the next write: the latest export of each open database
+@versioned(db_path, maxsize=MAX_OPEN_DATABASES, per_path=1)
+def export_topics(export_format):
+    return export_query(db_path(), EXPORT_SQL, TOPIC_COLUMNS, export_format)
@@ -0,0 +1,151 @@
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from core.db import MAX_OPEN_DATABASES, connect, process_wide
+from core.instrument import attach, current_run
+
+# Most write requests committed together in one transaction
+MAX_BATCH = 64
+# How long the writer keeps retrying to take the write lock while another process holds it.
+# Each attempt already waits for core.db.BUSY_TIMEOUT_MS.
+LOCK_WAIT_SECONDS = 300
+
+
+# Raised by submit() on a writer that has been closed
+class WriterClosed(RuntimeError):
+    pass
+
+
+# One background thread that owns the only writing connection to a database file.
+# Sessions hand it write functions; whatever has queued up while the previous batch was committing
+# is applied in a single transaction (group commit), each request inside its own savepoint so a
+# failing request is rolled back and reported without affecting the others in its batch.
+# Long jobs (imports, whole-library reschedules, syncs) are submitted as exclusive requests, which are
+# committed in a transaction of their own; the requests queued behind them wait instead of failing on the lock.
+class WriteQueue:
+    def __init__(self, db_path, max_batch=MAX_BATCH):
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self._requests = queue.Queue()
+        # An exclusive request taken off the queue while a batch was being collected; it starts the next batch
+        self._held = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=f"writer-{db_path}", daemon=True)
+        self._thread.start()
+
+    # Queue func(conn, *args) and return a Future for its result, set once the batch has committed.
+    # The profiled run of the caller, if any, is kept with the request so its statements and rows are counted.
+    def submit(self, func, *args, exclusive=False):
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise WriterClosed(self.db_path)
+            self._requests.put((future, func, args, exclusive, current_run()))
+        return future
+
+    # Stop accepting requests; the thread commits what is already queued, then closes its connection
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._requests.put(None)
+
+    def _next_batch(self):
+        if self._held is not None:
+            batch, self._held = [self._held], None
+        else:
+            batch = [self._requests.get()]
+        if batch[0] is not None and batch[0][3]:
+            return batch
+        while len(batch) < self.max_batch and batch[-1] is not None:
+            try:
+                request = self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None and request[3]:
+                self._held = request
+                break
+            batch.append(request)
+        return batch
+
+    # Take the write lock, retrying while another process holds it for longer than the busy timeout
+    def _begin(self, conn):
+        deadline = time.monotonic() + LOCK_WAIT_SECONDS
+        while True:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                return
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) or time.monotonic() > deadline:
+                    raise
+
+    def _apply(self, conn, batch):
+        applied = []
+        self._begin(conn)
+        for future, func, args, exclusive, record in batch:
+            if not future.set_running_or_notify_cancel():
+                continue
+            conn.execute("SAVEPOINT request")
+            attach(conn, record)
+            try:
+                result = func(conn, *args)
+            except Exception as e:
+                attach(conn, None)
+                conn.execute("ROLLBACK TO request")
+                conn.execute("RELEASE request")
+                future.set_exception(e)
+            else:
+                attach(conn, None)
+                conn.execute("RELEASE request")
+                applied.append((future, result))
+        conn.commit()
+        return applied
+
+    def _commit(self, conn, batch):
+        try:
+            applied = self._apply(conn, batch)
+        except Exception as e:
+            # The commit itself failed: nothing in the batch was written
+            if conn.in_transaction:
+                conn.rollback()
+            for future, func, args, exclusive, record in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, result in applied:
+            future.set_result(result)
+
+    def _run(self):
+        conn = connect(self.db_path)
+        while True:
+            batch = self._next_batch()
+            stop = batch[-1] is None
+            if stop:
+                batch.pop()
+            if batch:
+                self._commit(conn, batch)
+            if stop:
+                conn.close()
+                return
+
+
+# Function to get the process-wide writer for a database file
+@process_wide(maxsize=MAX_OPEN_DATABASES)
+def get_writer(db_path):
+    return WriteQueue(db_path)
+
+
+# Function to run func(conn, *args) on the writer thread of db_path and wait until it is committed.
+# Exceptions raised by func are re-raised in the caller. An exclusive write is committed on its own,
+# for long jobs that should neither hold up nor be rolled back with the interactive writes of a batch.
+def write(db_path, func, *args, exclusive=False):
+    while True:
+        try:
+            future = get_writer(db_path).submit(func, *args, exclusive=exclusive)
+        except WriterClosed:
+            # Evicted between lookup and submit; the next lookup starts a new writer
+            continue
+        return future.result()
@@ -0,0 +1,49 @@
+import json
+import tempfile
+
+from tornado.testing import AsyncHTTPTestCase
+
+from core import api, tenants
+
+
+class ApiTest(AsyncHTTPTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tenant_dir = tempfile.TemporaryDirectory()
+        self.default_tenant_dir, tenants.TENANT_DIR = tenants.TENANT_DIR, self.tenant_dir.name
+
+    def tearDown(self):
+        tenants.TENANT_DIR = self.default_tenant_dir
+        self.tenant_dir.cleanup()
+        super().tearDown()
+
+    def get_app(self):
+        return api.make_app()
+
+    def post(self, path, body):
+        response = self.fetch(path, method="POST", body=json.dumps(body), headers={api.USER_HEADER: "api-test"})
+        return response.code, json.loads(response.body)
+
+    def test_wrong_item_types_are_rejected(self):
+        for path, item in [("/topics", {"topic": "a", "category": ["ML"]}),
+                           ("/topics", {"topic": ["a"], "category": "ML"}),
+                           ("/topics", {"topic": "a", "category": "ML", "resource": 1}),
+                           ("/revisions", {"topic": "a", "entry_date": 20240101}),
+                           ("/revisions/done", {"topic": ["a"], "revision": 1}),
+                           ("/revisions/done", {"topic": "a", "revision": "1"}),
+                           ("/revisions/done", {"topic": "a", "revision": True}),
+                           ("/revisions/done", "a:1")]:
+            key = "revisions" if path == "/revisions/done" else "topics"
+            code, body = self.post(path, {key: [item]})
+            self.assertEqual(code, 400, (path, item, body))
+
+    def test_counts_are_rows_changed(self):
+        self.assertEqual(self.post("/revisions", {"topics": [{"topic": "a"}, {"topic": "b"}, {"topic": "a"}]}),
+                         (200, {"added": 2}))
+        code, body = self.post("/revisions/done", {"revisions": [{"topic": "a", "revision": 1},
+                                                                 {"topic": "a", "revision": 1},
+                                                                 {"topic": "a", "revision": 9},
+                                                                 {"topic": "missing", "revision": 1}]})
+        self.assertEqual((code, body), (200, {"updated": 1}))
+        code, body = self.post("/revisions/done", {"revisions": [{"topic": "a", "revision": 9}]})
+        self.assertEqual((code, body), (200, {"updated": 0}))
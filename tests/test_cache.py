@@ -0,0 +1,79 @@
+import sqlite3
+import subprocess
+import sys
+
+from core.cache import versioned
+from core.db import connection, transaction
+from core.writer import write
+
+
+def _create(path):
+    with transaction(path) as conn:
+        conn.execute("CREATE TABLE topics (topic_name TEXT)")
+    return path
+
+
+def _counter(path):
+    calls = []
+
+    @versioned(path)
+    def count():
+        calls.append(1)
+        with connection(path) as conn:
+            return conn.execute("SELECT COUNT(*) FROM topics").fetchone()[0]
+    return count, calls
+
+
+def _insert(conn, name):
+    conn.execute("INSERT INTO topics VALUES (?)", (name,))
+
+
+def test_reads_are_cached_until_a_write_in_this_process(tmp_path):
+    path = _create(str(tmp_path / "topic.db"))
+    count, calls = _counter(path)
+    assert (count(), count(), len(calls)) == (0, 0, 1)
+    write(path, _insert, "a")
+    assert (count(), count(), len(calls)) == (1, 1, 2)
+    with transaction(path) as conn:
+        _insert(conn, "b")
+    assert (count(), len(calls)) == (2, 3)
+
+
+def test_writes_from_another_process_refresh_the_cache(tmp_path):
+    path = _create(str(tmp_path / "topic.db"))
+    count, calls = _counter(path)
+    assert count() == 0
+    subprocess.run([sys.executable, "-c", "import sqlite3, sys; conn = sqlite3.connect(sys.argv[1]); "
+                    "conn.execute(\"INSERT INTO topics VALUES ('a')\"); conn.commit()", path], check=True)
+    assert count() == 1
+    # A connection outside the pools and the writer, as a sync uses for its peer
+    conn = sqlite3.connect(path)
+    _insert(conn, "b")
+    conn.commit()
+    conn.close()
+    assert (count(), len(calls)) == (2, 3)
+
+
+def test_per_path_limit_keeps_other_databases(tmp_path):
+    paths = [_create(str(tmp_path / f"{user}.db")) for user in ("alice", "bob")]
+    current = [paths[0]]
+    calls = []
+
+    @versioned(lambda: current[0], maxsize=8, per_path=1)
+    def export(export_format):
+        calls.append((current[0], export_format))
+        return export_format
+
+    for path in paths:
+        current[0] = path
+        export("csv")
+    for path in paths:
+        current[0] = path
+        export("csv")
+    assert len(calls) == 2
+    # A second format replaces the first export of the same database only
+    export("xlsx")
+    export("csv")
+    current[0] = paths[0]
+    export("csv")
+    assert len(calls) == 4
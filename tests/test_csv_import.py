@@ -0,0 +1,58 @@
+import io
+import json
+import sqlite3
+
+from core.csv_import import import_topics_csv
+from core.db import connection
+from core.ordering import POSITION_GAP
+from core.topics import create_schema
+
+
+def test_out_of_range_position_is_a_rejected_row(tmp_path):
+    path = str(tmp_path / "topic.db")
+    with connection(path) as conn:
+        create_schema(conn)
+        conn.commit()
+    data = b"Position,Topic Name,Category,Resource\n0,a,ML,r\n1e20,b,ML,r\n-1e20,c,ML,r\n1,d,ML,r\n"
+    result = import_topics_csv(path, io.BytesIO(data))
+    assert (result.upserted, result.rejected) == (2, [(3, "position is out of range"), (4, "position is out of range")])
+    assert sqlite3.connect(path).execute("SELECT topic_name FROM topics ORDER BY 1").fetchall() == [("a",), ("d",)]
+
+
+def test_import_recounts_category_stats_and_restores_triggers(tmp_path):
+    path = str(tmp_path / "topic.db")
+    with connection(path) as conn:
+        create_schema(conn)
+        conn.execute("INSERT INTO topics (position, topic_name, category, resource) VALUES (5, 'old', 'DL', 'r')")
+        conn.commit()
+    data = b"Position,Topic Name,Category,Resource\n0,a,ML,r\n1,b,ML,r\n0,c,CV,r\n"
+    import_topics_csv(path, io.BytesIO(data))
+
+    conn = sqlite3.connect(path)
+    stats = "SELECT category, count, max_position FROM category_stats ORDER BY 1"
+    assert conn.execute(stats).fetchall() == [("CV", 1, 0), ("ML", 2, POSITION_GAP)]
+    # Single-row writes after the import are counted by the triggers again
+    conn.execute("INSERT INTO topics (position, topic_name, category, resource) VALUES (0, 'd', 'CV', 'r')")
+    conn.execute("DELETE FROM topics WHERE topic_name = 'a'")
+    assert conn.execute(stats).fetchall() == [("CV", 2, 0), ("ML", 1, POSITION_GAP)]
+
+
+def test_import_logs_only_the_rows_it_changes(tmp_path):
+    path = str(tmp_path / "topic.db")
+    with connection(path) as conn:
+        create_schema(conn)
+        conn.commit()
+    import_topics_csv(path, io.BytesIO(b"Position,Topic Name,Category,Resource\n0,a,ML,r\n1,b,ML,r\n2,c,ML,r\n"))
+    conn = sqlite3.connect(path)
+    seq = conn.execute("SELECT MAX(seq) FROM change_log").fetchone()[0]
+
+    result = import_topics_csv(path, io.BytesIO(b"Position,Topic Name,Category,Resource\n0,a,ML,r\n1,b,ML,new\n0,d,CV,r\n"))
+    assert result[:3] == (2, 1, 1)
+    changes = conn.execute("SELECT row_key, op, row_data FROM change_log WHERE seq > ? ORDER BY row_key",
+                           (seq,)).fetchall()
+    assert [(json.loads(key)["topic_name"], op) for key, op, row in changes] == [
+        ("b", "upsert"), ("c", "delete"), ("d", "upsert")]
+    assert json.loads(changes[0][2]) == {"position": POSITION_GAP, "topic_name": "b", "category": "ML", "resource": "new"}
+    # Single-row writes after the import are logged by the triggers again
+    conn.execute("DELETE FROM topics WHERE topic_name = 'a'")
+    assert conn.execute("SELECT op FROM change_log ORDER BY seq DESC LIMIT 1").fetchone() == ("delete",)
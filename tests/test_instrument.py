@@ -0,0 +1,56 @@
+from core import instrument
+from core.cache import versioned
+from core.db import connection, transaction
+from core.instrument import profiled_run, timed
+from core.writer import write
+
+
+def _profile(monkeypatch, tmp_path):
+    monkeypatch.setenv(instrument.ENV_VAR, "1")
+    monkeypatch.setattr(instrument, "PROFILE_LOG", str(tmp_path / "profile.jsonl"))
+    entries = []
+    monkeypatch.setattr(instrument, "_show_panel", entries.append)
+    return entries
+
+
+def test_rows_are_counted_once_where_they_are_fetched(tmp_path, monkeypatch):
+    entries = _profile(monkeypatch, tmp_path)
+    path = str(tmp_path / "topic.db")
+    with transaction(path) as conn:
+        conn.execute("CREATE TABLE topics (topic_name TEXT)")
+        conn.executemany("INSERT INTO topics VALUES (?)", [(f"t{n}",) for n in range(40)])
+
+    @timed("retrieve_page")
+    def retrieve_page():
+        with connection(path) as conn:
+            return conn.execute("SELECT topic_name FROM topics LIMIT 25").fetchall()
+
+    @versioned(path)
+    @timed("page_dataframe")
+    def page_dataframe():
+        return list(retrieve_page())
+
+    for run in range(2):
+        with profiled_run("test"):
+            page_dataframe()
+    first, second = entries
+    timings = {name: rows for name, calls, ms, rows in first["timings"]}
+    assert (first["rows"], timings["page_dataframe"], timings["retrieve_page"]) == (25, 25, 25)
+    # Served from the cache: nothing was fetched
+    assert (second["rows"], second["queries"]) == (0, 0)
+
+
+def test_writer_statements_and_rows_count_for_the_submitting_run(tmp_path, monkeypatch):
+    entries = _profile(monkeypatch, tmp_path)
+    path = str(tmp_path / "topic.db")
+    with transaction(path) as conn:
+        conn.execute("CREATE TABLE topics (topic_name TEXT)")
+
+    def add(conn):
+        count = conn.execute("SELECT COUNT(*) FROM topics").fetchone()[0]
+        conn.execute("INSERT INTO topics VALUES (?)", (f"t{count}",))
+
+    with profiled_run("test"):
+        write(path, add)
+    write(path, add)
+    assert (entries[0]["rows"], entries[0]["queries"]) == (1, 2)
@@ -0,0 +1,98 @@
+import sqlite3
+
+from core.revision_schema import SCHEMA_VERSION, migrate
+from core.topics import category_ranks, create_schema, fts_query
+
+
+def _open(tmp_path):
+    return sqlite3.connect(str(tmp_path / "revision_schedule.db"))
+
+
+def _version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def test_new_database_starts_at_latest_version(tmp_path):
+    conn = _open(tmp_path)
+    migrate(conn)
+    assert _version(conn) == SCHEMA_VERSION
+    names = {name for name, in conn.execute("SELECT name FROM sqlite_master")}
+    assert {"topics", "revisions", "daily_load", "change_log", "sync_peers", "change_log_state",
+            "topics_delete_revisions"} <= names
+
+
+def test_wide_table_is_upgraded(tmp_path):
+    conn = _open(tmp_path)
+    conn.execute('''CREATE TABLE topics (id INTEGER PRIMARY KEY AUTOINCREMENT, topic_name TEXT UNIQUE NOT NULL,
+                    entry_date DATE NOT NULL, revision_1 DATE, revision_2 DATE, revision_3 DATE,
+                    revision_4 DATE, revision_5 DATE, done_1 INTEGER, done_2 INTEGER)''')
+    conn.execute('''INSERT INTO topics VALUES (1, 'a', '2024-01-01', '2024-01-08', '2024-01-22', '2024-02-21',
+                    '2024-04-21', '2024-07-20', 1, 0)''')
+    conn.commit()
+
+    migrate(conn)
+    assert _version(conn) == SCHEMA_VERSION
+    assert conn.execute("SELECT topic_name, entry_date, ease FROM topics").fetchall() == [("a", 19723, 2.5)]
+    assert conn.execute("SELECT revision_no, due_date, done FROM revisions ORDER BY revision_no").fetchall() == [
+        (1, 19730, 1), (2, 19744, 0), (3, 19774, 0), (4, 19834, 0), (5, 19924, 0)]
+    assert conn.execute("SELECT SUM(total), SUM(done) FROM daily_load").fetchone() == (5, 1)
+    # The existing rows are backfilled into the change log so a new peer can pull them
+    assert conn.execute("SELECT table_name, COUNT(*) FROM change_log GROUP BY 1 ORDER BY 1").fetchall() == [
+        ("revisions", 5), ("topics", 1)]
+
+
+def test_migrate_is_idempotent(tmp_path):
+    conn = _open(tmp_path)
+    migrate(conn)
+    conn.execute("INSERT INTO topics (topic_name, entry_date) VALUES ('a', 20000)")
+    conn.commit()
+    migrate(conn)
+    assert conn.execute("SELECT COUNT(*) FROM topics").fetchone()[0] == 1
+
+
+def test_orphan_revisions_are_dropped(tmp_path):
+    conn = _open(tmp_path)
+    migrate(conn)
+    conn.execute("DROP TRIGGER topics_delete_revisions")
+    conn.execute("INSERT INTO topics (topic_name, entry_date) VALUES ('a', 20000), ('b', 20000)")
+    conn.execute("INSERT INTO revisions (topic_id, revision_no, due_date) VALUES (1, 1, 20007), (2, 1, 20007)")
+    conn.execute("DELETE FROM topics WHERE topic_name = 'a'")
+    # A database from before version 4
+    conn.execute("PRAGMA user_version = 3")
+    conn.commit()
+    seq = conn.execute("SELECT MAX(seq) FROM change_log").fetchone()[0]
+
+    migrate(conn)
+    assert conn.execute("SELECT topic_id FROM revisions").fetchall() == [(2,)]
+    assert conn.execute("SELECT due_date, total FROM daily_load").fetchall() == [(20007, 1)]
+    assert conn.execute("SELECT MAX(seq) FROM change_log").fetchone()[0] == seq
+    conn.execute("DELETE FROM topics WHERE topic_name = 'b'")
+    assert conn.execute("SELECT COUNT(*) FROM revisions").fetchone()[0] == 0
+
+
+def test_topics_without_ids_are_upgraded(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "topic.db"))
+    conn.execute('''CREATE TABLE topics (position INTEGER, topic_name TEXT UNIQUE NOT NULL,
+                    category TEXT NOT NULL, resource TEXT NOT NULL)''')
+    conn.executemany("INSERT INTO topics VALUES (?, ?, ?, ?)", [(0, "alpha", "ML", "r"), (0, "beta", "ML", "r"),
+                                                                (1, "gamma", "ML", "r"), (0, "delta", "DL", "r")])
+    conn.execute('''CREATE VIRTUAL TABLE topics_fts USING fts5
+                    (topic_name, category, resource, content='topics', content_rowid='rowid')''')
+    conn.execute("INSERT INTO topics_fts (topics_fts) VALUES ('rebuild')")
+    conn.commit()
+    create_schema(conn)
+    conn.commit()
+    assert conn.execute("SELECT id, topic_name FROM topics ORDER BY id").fetchall() == [
+        (1, "alpha"), (2, "beta"), (3, "gamma"), (4, "delta")]
+    assert conn.execute("SELECT COUNT(*) FROM change_log").fetchone()[0] == 4
+    assert conn.execute("SELECT category, count FROM category_stats ORDER BY 1").fetchall() == [("DL", 1), ("ML", 3)]
+
+    # Ids, and with them the full-text index and the rankings, survive a VACUUM after a delete
+    conn.execute("DELETE FROM topics WHERE topic_name = 'alpha'")
+    conn.commit()
+    conn.execute("VACUUM")
+    assert conn.execute("SELECT id FROM topics WHERE topic_name = 'gamma'").fetchone() == (3,)
+    matches = conn.execute('''SELECT t.topic_name FROM topics_fts f JOIN topics t ON t.id = f.rowid
+                              WHERE topics_fts MATCH ?''', (fts_query("gam"),)).fetchall()
+    assert matches == [("gamma",)]
+    assert category_ranks(conn, [(3, "ML", 1), (2, "ML", 0), (4, "DL", 0)]) == [1, 0, 0]
@@ -0,0 +1,32 @@
+from datetime import date
+
+from core.db import connection
+from core.revision_schema import migrate, to_day
+from core.scheduler import complete_revisions, make_strategy
+from core.writer import write
+
+
+def _revisions(path):
+    with connection(path) as conn:
+        return conn.execute("SELECT revision_no, due_date, done, done_date FROM revisions ORDER BY revision_no").fetchall()
+
+
+def _add_topic(conn):
+    conn.execute("INSERT INTO topics (topic_name, entry_date) VALUES ('a', ?)", (to_day(date(2024, 1, 1)),))
+    conn.executemany("INSERT INTO revisions (topic_id, revision_no, due_date) VALUES (1, ?, ?)",
+                     [(n, to_day(date(2024, 1, 1)) + 7 * n) for n in range(1, 6)])
+
+
+def test_marking_a_done_revision_again_changes_nothing(tmp_path):
+    path = str(tmp_path / "revision_schedule.db")
+    with connection(path) as conn:
+        migrate(conn)
+    write(path, _add_topic)
+    strategy = make_strategy()
+
+    assert complete_revisions(path, strategy, [("a", 1)], date(2024, 1, 8)) == 1
+    after_first = _revisions(path)
+    assert after_first[0][2:] == (1, to_day(date(2024, 1, 8)))
+
+    assert complete_revisions(path, strategy, [("a", 1)], date(2024, 3, 1)) == 0
+    assert _revisions(path) == after_first
@@ -0,0 +1,142 @@
+import sqlite3
+import time
+
+import pytest
+
+from core import sync as sync_module
+from core.db import connection
+from core.revision_schema import SYNC_TABLES, migrate
+from core.sync import changes_since, compact_if_needed, copy_path, sync
+from core.writer import write
+
+
+def _create(path):
+    with connection(path) as conn:
+        migrate(conn)
+    return path
+
+
+def _add_topic(conn, topic_name):
+    conn.execute("INSERT INTO topics (topic_name, entry_date) VALUES (?, 20000)", (topic_name,))
+    topic_id = conn.execute("SELECT id FROM topics WHERE topic_name = ?", (topic_name,)).fetchone()[0]
+    conn.executemany("INSERT INTO revisions (topic_id, revision_no, due_date) VALUES (?, ?, ?)",
+                     [(topic_id, n, 20000 + 7 * n) for n in range(1, 6)])
+
+
+def _delete_topic(conn, topic_name):
+    conn.execute("DELETE FROM topics WHERE topic_name = ?", (topic_name,))
+
+
+def _reschedule(conn, topic_name, revision_no):
+    conn.execute('''UPDATE revisions SET due_date = due_date + 1 WHERE revision_no = ?
+                    AND topic_id = (SELECT id FROM topics WHERE topic_name = ?)''', (revision_no, topic_name))
+
+
+def _state(path):
+    with connection(path) as conn:
+        topics = conn.execute("SELECT topic_name FROM topics ORDER BY topic_name").fetchall()
+        revisions = conn.execute('''SELECT t.topic_name, r.revision_no, r.due_date FROM revisions r
+                                    LEFT JOIN topics t ON t.id = r.topic_id ORDER BY 1, 2''').fetchall()
+    return topics, revisions
+
+
+@pytest.fixture
+def pair(tmp_path):
+    a = _create(str(tmp_path / "a.db"))
+    b = _create(str(tmp_path / "b.db"))
+    write(a, _add_topic, "a")
+    write(a, _add_topic, "b")
+    sync(a, b, SYNC_TABLES, setup=migrate)
+    return a, b
+
+
+def test_sync_copies_topics(pair):
+    a, b = pair
+    assert _state(a) == _state(b)
+    assert len(_state(b)[1]) == 10
+
+
+def test_delete_wins_over_reschedule_of_deleted_topic(pair):
+    a, b = pair
+    write(a, _delete_topic, "a")
+    time.sleep(0.01)
+    write(b, _reschedule, "a", 2)
+
+    sync(a, b, SYNC_TABLES, setup=migrate)
+    # Later syncs must not fail on the revision whose topic is gone
+    sync(a, b, SYNC_TABLES, setup=migrate)
+
+    topics, revisions = _state(a)
+    assert topics == [("b",)]
+    assert [row[0] for row in revisions] == ["b"] * 5
+    assert _state(b) == (topics, revisions)
+
+
+def test_topic_delete_from_peer_removes_its_revisions(pair):
+    a, b = pair
+    write(b, _delete_topic, "b")
+    sync(a, b, SYNC_TABLES, setup=migrate)
+    assert _state(a) == _state(b) == ([("a",)], [("a", n, 20000 + 7 * n) for n in range(1, 6)])
+
+
+def test_failed_sync_changes_neither_side(pair, monkeypatch):
+    a, b = pair
+    write(a, _add_topic, "c")
+    write(b, _add_topic, "d")
+    before = _state(a), _state(b)
+
+    apply_changes = sync_module._apply_changes
+    calls = []
+
+    def failing(conn, changes, tables, source):
+        calls.append(source)
+        if len(calls) == 2:
+            raise sqlite3.IntegrityError("simulated")
+        return apply_changes(conn, changes, tables, source)
+
+    monkeypatch.setattr(sync_module, "_apply_changes", failing)
+    with pytest.raises(sqlite3.IntegrityError):
+        sync(a, b, SYNC_TABLES, setup=migrate)
+    assert (_state(a), _state(b)) == before
+
+    monkeypatch.setattr(sync_module, "_apply_changes", apply_changes)
+    result = sync(a, b, SYNC_TABLES, setup=migrate)
+    assert (result.sent, result.received) == (6, 6)
+    assert _state(a) == _state(b)
+
+
+def _log_size(path):
+    with connection(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM change_log").fetchone()[0]
+
+
+def test_sync_compacts_both_logs(pair):
+    a, b = pair
+    for n in range(3):
+        write(a, _reschedule, "a", 1)
+        write(b, _reschedule, "b", 1)
+    sync(a, b, SYNC_TABLES, setup=migrate)
+    # One entry per topic and revision is left on each side
+    assert _log_size(a) == _log_size(b) == 12
+    assert _state(a) == _state(b)
+
+
+def test_log_is_compacted_past_threshold(tmp_path):
+    a = _create(str(tmp_path / "a.db"))
+    write(a, _add_topic, "a")
+    for n in range(5):
+        write(a, _reschedule, "a", 1)
+    assert compact_if_needed(a, threshold=20) == 0
+    assert compact_if_needed(a, threshold=10) == 5
+    assert compact_if_needed(a, threshold=0) == 0
+    assert [change[2] for change in changes_since(a).changes][-1] == '{"topic_name":"a","revision_no":1}'
+
+
+@pytest.mark.parametrize("name", ["../a", "/tmp/a.db", "", ".hidden", "a/b"])
+def test_copy_names_cannot_leave_the_sync_directory(tmp_path, name):
+    with pytest.raises(ValueError):
+        copy_path(str(tmp_path / "topic.db"), name)
+
+
+def test_copy_path_is_next_to_the_database(tmp_path):
+    assert copy_path(str(tmp_path / "topic.db"), "laptop") == str(tmp_path / "sync" / "laptop" / "topic.db")